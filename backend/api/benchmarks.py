@@ -0,0 +1,183 @@
+"""
+Бенчмарки основных эндпоинтов API.
+Запросы проходят через настоящие urls и middleware в текущем процессе,
+данные берутся из текущей БД (см. команду generate_data).
+"""
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+
+from django.db import connections
+from django.db.models import Count
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app.models import Ingredient, Recipe, Tag
+from foodgram_backend.middleware import QueryStats
+from users.models import User
+
+
+class Scenario:
+    """
+    Сценарий: один или несколько запросов, замеряемых как единое целое.
+    Запрос - (метод, url) или (метод, url, тело в JSON).
+    """
+
+    def __init__(self, name, requests):
+        self.name = name
+        self.requests = requests
+
+    def run(self, client):
+        for method, url, *data in self.requests:
+            response = getattr(client, method)(url, *data, format='json')
+            if response.status_code >= 400:
+                raise RuntimeError(
+                    f'{self.name}: {method.upper()} {url} '
+                    f'-> {response.status_code}'
+                )
+
+
+def _percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def sample_fixtures():
+    """
+    Детерминированно выбираем пользователя с подписками, избранным
+    и корзиной, а также рецепт и тег для сценариев.
+    """
+    user = User.objects.annotate(
+        follows=Count('follower', distinct=True),
+        carts=Count('shop_list', distinct=True),
+    ).filter(follows__gt=0, carts__gt=0).order_by('-follows', 'pk').first()
+    if user is None:
+        raise RuntimeError(
+            'Нет данных для бенчмарка, запустите generate_data'
+        )
+    recipe = Recipe.objects.exclude(
+        is_favorited__user=user
+    ).exclude(is_in_shopping_cart__user=user).order_by('pk').first()
+    tag = Tag.objects.order_by('pk').first()
+    ingredient = Ingredient.objects.order_by('pk').first()
+    return user, recipe, tag, ingredient
+
+
+def build_scenarios(recipe, tag, ingredient):
+    prefix = ingredient.name[:2]
+    return [
+        Scenario('recipes-list', [('get', '/api/recipes/?limit=50')]),
+        Scenario('recipes-list-tag', [
+            ('get', f'/api/recipes/?tags={tag.slug}&limit=50'),
+        ]),
+        Scenario('recipes-list-favorited', [
+            ('get', '/api/recipes/?is_favorited=1&limit=50'),
+        ]),
+        Scenario('recipes-list-quick', [
+            ('get', '/api/recipes/?cooking_time_max=30&limit=50'),
+        ]),
+        Scenario('recipes-list-ingredient', [
+            ('get', f'/api/recipes/?ingredients={ingredient.pk}&limit=50'),
+        ]),
+        Scenario('recipes-list-no-ingredient', [
+            ('get', (
+                f'/api/recipes/?exclude_ingredients={ingredient.pk}'
+                '&limit=50'
+            )),
+        ]),
+        Scenario('recipes-pantry', [
+            ('post', '/api/recipes/pantry/', {
+                'ingredients': list(range(ingredient.pk, ingredient.pk + 20)),
+                'limit': 50,
+            }),
+        ]),
+        Scenario('recipes-detail', [('get', f'/api/recipes/{recipe.pk}/')]),
+        Scenario('recipes-similar', [
+            ('get', f'/api/recipes/{recipe.pk}/similar/'),
+        ]),
+        Scenario('users-subscriptions', [
+            ('get', '/api/users/subscriptions/?recipes_limit=3'),
+        ]),
+        Scenario('ingredients-search', [
+            ('get', f'/api/ingredients/?name={prefix}'),
+        ]),
+        Scenario('shopping-cart-download', [
+            ('get', '/api/recipes/download_shopping_cart/'),
+        ]),
+        Scenario('favorite-toggle', [
+            ('post', f'/api/recipes/{recipe.pk}/favorite/'),
+            ('delete', f'/api/recipes/{recipe.pk}/favorite/'),
+        ]),
+        Scenario('shopping-cart-toggle', [
+            ('post', f'/api/recipes/{recipe.pk}/shopping_cart/'),
+            ('delete', f'/api/recipes/{recipe.pk}/shopping_cart/'),
+        ]),
+    ]
+
+
+def measure(scenario, client, iterations, warmup):
+    """Время (p50/p95), число SQL запросов и пик выделенной памяти."""
+    for _ in range(warmup):
+        scenario.run(client)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        scenario.run(client)
+        timings.append(time.perf_counter() - start)
+    stats = QueryStats()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        tracemalloc.start()
+        try:
+            scenario.run(client)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return {
+        'p50_ms': round(statistics.median(timings) * 1000, 3),
+        'p95_ms': round(_percentile(timings, 95) * 1000, 3),
+        'mean_ms': round(statistics.mean(timings) * 1000, 3),
+        'queries': stats.count,
+        'peak_alloc_kb': round(peak / 1024, 1),
+    }
+
+
+def run_benchmarks(iterations=30, warmup=3, only=None):
+    user, recipe, tag, ingredient = sample_fixtures()
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {AccessToken.for_user(user)}'
+    )
+    results = {}
+    for scenario in build_scenarios(recipe, tag, ingredient):
+        if only and scenario.name not in only:
+            continue
+        results[scenario.name] = measure(
+            scenario, client, iterations, warmup
+        )
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Регрессии относительно сохраненного результата: рост p95 больше
+    чем на threshold (доля) или рост числа SQL запросов.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + threshold):
+            regressions.append(
+                f'{name}: p95 {previous["p95_ms"]} -> {current["p95_ms"]} ms'
+            )
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                f'{name}: queries {previous["queries"]} '
+                f'-> {current["queries"]}'
+            )
+    return regressions
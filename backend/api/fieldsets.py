@@ -0,0 +1,67 @@
+"""
+Выборочные поля ответа: ?fields=id,name оставляет только перечисленные
+поля, ?omit=text убирает перечисленные. Вместе с полями ответа view
+убирает из запроса к БД ненужные аннотации и prefetch.
+"""
+from collections import OrderedDict
+
+from rest_framework.exceptions import ValidationError
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def split_names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsetSerializerMixin:
+    """Сериализатор оставляет только поля из context['fieldset']."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fieldset = self.context.get('fieldset')
+        if fieldset is None:
+            return fields
+        return OrderedDict(
+            (name, field) for name, field in fields.items()
+            if name in fieldset
+        )
+
+
+class SparseFieldsetViewMixin:
+    """?fields= и ?omit= для действий fieldset_actions."""
+    fieldset_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        """Запрошенные поля или None, если нужны все."""
+        if not hasattr(self, '_fieldset'):
+            self._fieldset = self.parse_fieldset()
+        return self._fieldset
+
+    def parse_fieldset(self):
+        if self.request is None or self.action not in self.fieldset_actions:
+            return None
+        params = self.request.query_params
+        if FIELDS_PARAM not in params and OMIT_PARAM not in params:
+            return None
+        available = set(self.get_serializer_class()().fields)
+        requested = split_names(params.get(FIELDS_PARAM, '')) or available
+        omitted = split_names(params.get(OMIT_PARAM, ''))
+        unknown = (requested | omitted) - available
+        if unknown:
+            raise ValidationError({
+                FIELDS_PARAM: f'Неизвестные поля: {", ".join(sorted(unknown))}'
+            })
+        return requested - omitted
+
+    def wants(self, name):
+        """Нужно ли поле name в ответе."""
+        fieldset = self.get_fieldset()
+        return fieldset is None or name in fieldset
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'fieldset': self.get_fieldset(),
+        }
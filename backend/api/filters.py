@@ -1,11 +1,24 @@
+from django import forms
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import (
-    FilterSet, CharFilter, BooleanFilter, ModelChoiceFilter,
+    FilterSet, BaseInFilter, CharFilter, BooleanFilter, ChoiceFilter,
+    ModelChoiceFilter, NumberFilter, RangeFilter,
 )
+from rest_framework.exceptions import ValidationError
 
-from app.models import Recipe, Ingredient
+from app.models import Composition, Recipe, Ingredient
+from foodgram_backend.settings import RECIPE_FILTER_MAX_INGREDIENTS
 from users.models import User
 
 
+class IntegerInFilter(BaseInFilter, NumberFilter):
+    """
+    Целые числа через запятую: ?ingredients=1,2.
+    Дробные значения - ошибка 400, а не округление.
+    """
+    field_class = forms.IntegerField
+
+
 class IngredientFilter(FilterSet):
     name = CharFilter(lookup_expr='startswith')
 
@@ -19,6 +32,15 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = BooleanFilter(method='filter_boolean')
     author = ModelChoiceFilter(queryset=User.objects.all())
     tags = CharFilter(field_name='tags__slug')
+    # ?cooking_time_min=10&cooking_time_max=30
+    cooking_time = RangeFilter()
+    ingredients = IntegerInFilter(method='filter_ingredients')
+    exclude_ingredients = IntegerInFilter(
+        method='filter_exclude_ingredients'
+    )
+    ordering = ChoiceFilter(
+        choices=(('popular', 'popular'),), method='filter_ordering'
+    )
 
     def filter_boolean(self, queryset, name, value):
         """Фильтруем shopping_cart и favorited."""
@@ -28,6 +50,40 @@ class RecipeFilter(FilterSet):
             )
         return queryset
 
+    def ingredient_ids(self, name, value):
+        ids = set(value)
+        if len(ids) > RECIPE_FILTER_MAX_INGREDIENTS:
+            raise ValidationError({name: (
+                'Можно указать не больше '
+                f'{RECIPE_FILTER_MAX_INGREDIENTS} ингредиентов'
+            )})
+        return ids
+
+    def filter_ingredients(self, queryset, name, value):
+        """
+        Рецепты со всеми ингредиентами: по EXISTS на каждый, без JOIN,
+        который размножает строки рецептов.
+        """
+        for ingredient_id in self.ingredient_ids(name, value):
+            queryset = queryset.filter(Exists(Composition.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id=ingredient_id,
+            )))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        """Рецепты без перечисленных ингредиентов (NOT EXISTS)."""
+        return queryset.filter(~Exists(Composition.objects.filter(
+            recipe=OuterRef('pk'),
+            ingredient_id__in=self.ingredient_ids(name, value),
+        )))
+
+    def filter_ordering(self, queryset, name, value):
+        """Популярные первыми, по индексу recipe_popular_idx."""
+        return queryset.order_by('-favorites_count', '-id')
+
     class Meta:
         model = Recipe
-        fields = ('is_favorited', 'is_in_shopping_cart', 'author', 'tags',)
+        fields = (
+            'is_favorited', 'is_in_shopping_cart', 'author', 'tags',
+            'cooking_time', 'ingredients', 'exclude_ingredients',
+        )
@@ -0,0 +1,75 @@
+import json
+import platform
+from pathlib import Path
+
+from django.core.management.base import (
+    BaseCommand, CommandError, CommandParser,
+)
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    """
+    Бенчмарк основных эндпоинтов на текущей БД.
+    Сохранить базовую линию:
+        python manage.py benchmark --save benchmarks/baseline.json
+    Сравнить с ней (ошибка при регрессии):
+        python manage.py benchmark --compare benchmarks/baseline.json
+    """
+    help = 'Benchmarking hot API endpoints against the current database'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--only', nargs='*',
+            help='scenario names to run',
+        )
+        parser.add_argument('--save', help='path to save results as json')
+        parser.add_argument('--compare', help='path to a baseline json')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='allowed p95 growth, 0.2 = 20%%',
+        )
+
+    def handle(self, *args, **options):
+        results = run_benchmarks(
+            iterations=options['iterations'],
+            warmup=options['warmup'],
+            only=options['only'],
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<26} p50 {result["p50_ms"]:>9.2f} ms  '
+                f'p95 {result["p95_ms"]:>9.2f} ms  '
+                f'queries {result["queries"]:>4}  '
+                f'peak {result["peak_alloc_kb"]:>9.1f} KiB'
+            )
+        if options['save']:
+            path = Path(options['save'])
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps({
+                'meta': {
+                    'created': timezone.now().isoformat(),
+                    'database': connection.vendor,
+                    'python': platform.python_version(),
+                    'iterations': options['iterations'],
+                },
+                'results': results,
+            }, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(f'saved to {path}')
+        if options['compare']:
+            baseline = json.loads(
+                Path(options['compare']).read_text(encoding='utf-8')
+            )
+            regressions = compare(
+                results, baseline['results'], options['threshold']
+            )
+            if regressions:
+                raise CommandError(
+                    'Regressions found:\n' + '\n'.join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS('no regressions'))
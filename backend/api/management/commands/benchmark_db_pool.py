@@ -0,0 +1,66 @@
+import copy
+import statistics
+import time
+
+from django.core.management.base import (
+    BaseCommand, CommandError, CommandParser,
+)
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.postgresql import base
+
+from foodgram_backend.db_pool import base as db_pool
+
+
+class Command(BaseCommand):
+    """
+    Стоимость подключения к БД на один HTTP запрос без пула и с пулом.
+    Итерация повторяет жизненный цикл запроса при CONN_MAX_AGE=0:
+    подключение, SELECT 1 и закрытие подключения.
+        python manage.py benchmark_db_pool --iterations 200
+    """
+    help = 'Benchmarking per-request connection cost with and without pool'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def measure(self, wrapper_class, settings_dict, iterations):
+        wrapper = wrapper_class(
+            copy.deepcopy(settings_dict), alias=f'benchmark_{id(self)}'
+        )
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            with wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            wrapper.close()
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Бенчмарк пула работает только с PostgreSQL')
+        settings_dict = {
+            **connection.settings_dict,
+            'ENGINE': 'foodgram_backend.db_pool',
+            'CONN_MAX_AGE': 0,
+        }
+        results = {}
+        for name, wrapper_class in (
+            ('direct', base.DatabaseWrapper),
+            ('pooled', db_pool.DatabaseWrapper),
+        ):
+            timings = self.measure(
+                wrapper_class, settings_dict, options['iterations']
+            )
+            results[name] = statistics.mean(timings)
+            self.stdout.write(
+                f'{name:<8} p50 {statistics.median(timings) * 1000:>8.3f} ms'
+                f'  p95 {statistics.quantiles(timings, n=20)[-1] * 1000:>8.3f}'
+                f' ms  mean {results[name] * 1000:>8.3f} ms'
+            )
+        db_pool.close_pools()
+        self.stdout.write(self.style.SUCCESS(
+            f'saved per request: '
+            f'{(results["direct"] - results["pooled"]) * 1000:.3f} ms'
+        ))
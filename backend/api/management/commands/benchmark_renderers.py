@@ -0,0 +1,105 @@
+import base64
+import io
+import os
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import renderers
+from api.benchmarks import sample_fixtures
+
+# Размер картинки в теле POST рецепта, байт до base64.
+IMAGE_SIZE = 512 * 1024
+
+
+class Command(BaseCommand):
+    """
+    Время рендеринга и размер ответа для реальных страниц API,
+    а также время разбора тела POST рецепта с картинкой в base64,
+    для стандартного json, orjson и MessagePack:
+        python manage.py benchmark_renderers --iterations 200
+    """
+    help = 'Benchmarking JSON and MessagePack renderers and parsers'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def pages(self):
+        """Данные (response.data) страниц, как их получает рендерер."""
+        user, recipe, _, _ = sample_fixtures()
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {AccessToken.for_user(user)}'
+        )
+        return {
+            name: client.get(url).data for name, url in (
+                ('recipes-list', '/api/recipes/?limit=50'),
+                ('recipes-list-included', (
+                    '/api/recipes/?limit=50'
+                    '&include=author,tags,ingredients'
+                )),
+                ('recipes-detail', f'/api/recipes/{recipe.pk}/'),
+                ('users-subscriptions', (
+                    '/api/users/subscriptions/?limit=50&recipes_limit=3'
+                )),
+            )
+        }
+
+    def recipe_body(self):
+        """Тело POST рецепта с картинкой в base64."""
+        image = base64.b64encode(os.urandom(IMAGE_SIZE)).decode()
+        return {
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in range(1, 11)
+            ],
+            'tags': [1, 2],
+            'image': f'data:image/png;base64,{image}',
+            'name': 'Рецепт',
+            'text': 'Описание рецепта ' * 50,
+            'cooking_time': 30,
+        }
+
+    def timeit(self, function, iterations):
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return statistics.median(timings) * 1000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        formats = [
+            ('json', JSONRenderer(), JSONParser()),
+            ('orjson', renderers.ORJSONRenderer(), renderers.ORJSONParser()),
+        ]
+        if renderers.orjson is None:
+            self.stdout.write('orjson не установлен, orjson = json')
+        if renderers.msgpack is not None:
+            formats.append((
+                'msgpack', renderers.MessagePackRenderer(),
+                renderers.MessagePackParser(),
+            ))
+        for name, data in self.pages().items():
+            for label, renderer, _ in formats:
+                size = len(renderer.render(data))
+                p50 = self.timeit(lambda: renderer.render(data), iterations)
+                self.stdout.write(
+                    f'render {name:<24} {label:<8} p50 {p50:>8.3f} ms'
+                    f'  {size / 1024:>8.1f} KiB'
+                )
+        body = self.recipe_body()
+        for label, renderer, parser in formats:
+            content = renderer.render(body)
+            p50 = self.timeit(
+                lambda: parser.parse(io.BytesIO(content)), iterations
+            )
+            self.stdout.write(
+                f'parse  {"recipe-create":<24} {label:<8} p50 {p50:>8.3f} ms'
+                f'  {len(content) / 1024:>8.1f} KiB'
+            )
@@ -0,0 +1,55 @@
+from django.core.management.base import (
+    BaseCommand, CommandError, CommandParser,
+)
+from django.db import transaction
+
+from api.query_budget import BUDGETS, check_budgets
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    """
+    Проверка бюджетов SQL запросов (api/query_budget.py).
+    Данные создаются в транзакции, которая затем откатывается:
+        python manage.py check_query_budget
+    """
+    help = 'Checking SQL query budgets of API actions'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--only', nargs='*',
+            help='budget names to check',
+        )
+
+    def handle(self, *args, **options):
+        budgets = [
+            budget for budget in BUDGETS
+            if not options['only'] or budget.name in options['only']
+        ]
+        try:
+            with transaction.atomic():
+                results = check_budgets(budgets)
+                raise _Rollback
+        except _Rollback:
+            pass
+        failures = []
+        for name, limit, count, queries, error in results:
+            label = name if limit is None else f'{name} (limit={limit})'
+            line = f'{label:<40} queries {count:>3}'
+            if error is None:
+                self.stdout.write(line)
+                continue
+            self.stdout.write(self.style.ERROR(f'{line}  {error}'))
+            failures.append(
+                f'{label}: {error}\n' + '\n'.join(
+                    f'  {sql}' for sql in queries
+                )
+            )
+        if failures:
+            raise CommandError(
+                'Query budgets exceeded:\n' + '\n'.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('all budgets met'))
@@ -0,0 +1,60 @@
+import json
+
+from django.core.management.base import (
+    BaseCommand, CommandError, CommandParser,
+)
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.query_plans import HOT_QUERIES, check_plans
+
+
+class Command(BaseCommand):
+    """
+    Проверка планов горячих запросов (api/query_plans.py) в PostgreSQL:
+        python manage.py generate_data --users 100000 --recipes 1000000
+        python manage.py check_query_plans
+    """
+    help = 'Checking that hot API queries read large tables by index'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--only', nargs='*',
+            help='query names to check',
+        )
+        parser.add_argument(
+            '--min-rows', type=int, default=10000,
+            help='tables with fewer rows may be scanned sequentially',
+        )
+        parser.add_argument(
+            '--show-plans', action='store_true',
+            help='print EXPLAIN output for every query',
+        )
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            raise CommandError(
+                'Проверка планов работает только с PostgreSQL'
+            )
+        queries = [
+            query for query in HOT_QUERIES
+            if not options['only'] or query.name in options['only']
+        ]
+        failures = []
+        for name, indexes, seq_scans, plan in check_plans(
+            queries, options['min_rows']
+        ):
+            line = f'{name:<32} {", ".join(indexes) or "-"}'
+            if seq_scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{line}  seq scan: {", ".join(seq_scans)}'
+                ))
+            else:
+                self.stdout.write(line)
+            if options['show_plans']:
+                self.stdout.write(json.dumps(plan, indent=2))
+        if failures:
+            raise CommandError(
+                'Sequential scans of large tables: ' + ', '.join(failures)
+            )
+        self.stdout.write(self.style.SUCCESS('all queries use indexes'))
@@ -1,5 +1,47 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import (
+    BasePagination, PageNumberPagination, _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPageNumberPagination(PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class KeysetPagination(BasePagination):
+    """
+    Страницы по ключу: ?before=<id>&limit=N.
+    В отличие от номера страницы не требует подсчета и смещения,
+    и новые записи не сдвигают уже полученные страницы.
+    """
+    before_query_param = 'before'
+    limit_query_param = 'limit'
+    default_limit = 10
+    max_limit = 100
+
+    def get_before(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.before_query_param], strict=True
+            )
+        except (KeyError, ValueError):
+            return None
+
+    def get_limit(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True, cutoff=self.max_limit,
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_paginated_response(self, request, data, next_key):
+        next_url = None
+        if next_key is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.before_query_param, next_key,
+            )
+        return Response({'next': next_url, 'results': data})
@@ -0,0 +1,324 @@
+"""
+Бюджеты SQL запросов для действий API и списков админки.
+Списки проверяются на полных страницах из 1 и 50 элементов: число
+запросов не должно зависеть от размера страницы. У действий с рецептами есть
+варианты с пустым кэшем (-cold): N+1 при сборке фрагментов прогретый
+кэш бы спрятал.
+"""
+import secrets
+from contextlib import nullcontext
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from app import feed, fragments
+from app.generator import DataGenerator
+from app.invalidation import bus
+from app.models import (
+    Composition, Favorite, Ingredient, Recipe, ShoppingCart, Tag, TagList,
+)
+from users.models import Follow, User
+
+PAGE_SIZES = (1, 50)
+SAVEPOINT_SQL = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+# Пустой кэш для замеров cold: общий кэш не очищаем и не заполняем.
+COLD_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'query-budget-cold',
+    },
+}
+
+
+class Budget:
+    """
+    Бюджет действия: не больше max_queries запросов.
+    В url подставляются {recipe}, {author}, {prefix} (начало имен
+    данных проверки) и {limit}; если в url есть {limit}, действие
+    проверяется на всех PAGE_SIZES.
+    warmup - выполнить запрос один раз до замера (по умолчанию для GET);
+    cold - замер с пустым кэшем Django (фрагменты, популярные рецепты),
+    кэши в памяти процесса (теги, ингредиенты) остаются прогретыми.
+    """
+
+    def __init__(self, name, method, url, max_queries, data=None,
+                 warmup=None, cold=False):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.max_queries = max_queries
+        self.data = data
+        self.warmup = method == 'get' if warmup is None else warmup
+        self.cold = cold
+
+    @property
+    def paged(self):
+        return '{limit}' in self.url
+
+    @property
+    def admin(self):
+        """Страница админки, открывается с сессией, а не с токеном."""
+        return self.url.startswith('/admin/')
+
+
+BUDGETS = (
+    Budget('recipes-list', 'get', '/api/recipes/?limit={limit}', 6),
+    Budget(
+        'recipes-list-favorited', 'get',
+        '/api/recipes/?is_favorited=1&limit={limit}', 6,
+    ),
+    Budget(
+        'recipes-list-filtered', 'get',
+        '/api/recipes/?cooking_time_max=30&ingredients=1,2'
+        '&exclude_ingredients=1000000&limit={limit}', 6,
+    ),
+    Budget(
+        'recipes-list-popular', 'get',
+        '/api/recipes/?ordering=popular&limit={limit}', 5,
+    ),
+    # Без тегов, автора и ингредиентов фрагменты не нужны даже без кэша.
+    Budget(
+        'recipes-list-sparse', 'get',
+        '/api/recipes/?fields=id,name,image,cooking_time&limit={limit}', 2,
+    ),
+    Budget(
+        'recipes-list-included', 'get',
+        '/api/recipes/?include=author,tags,ingredients&limit={limit}', 2,
+    ),
+    # Поиск ничего не меняет, а первый запрос загружает индекс.
+    Budget(
+        'recipes-pantry', 'post', '/api/recipes/pantry/', 1,
+        data={'ingredients': [1, 2, 3], 'limit': 50}, warmup=True,
+    ),
+    Budget('recipes-detail', 'get', '/api/recipes/{recipe}/', 5),
+    Budget('recipes-similar', 'get', '/api/recipes/{recipe}/similar/', 2),
+    Budget('recipes-feed', 'get', '/api/recipes/feed/?limit={limit}', 6),
+    # Пустой кэш: фрагменты строятся для всей страницы сразу.
+    Budget(
+        'recipes-list-cold', 'get', '/api/recipes/?limit={limit}', 5,
+        cold=True,
+    ),
+    Budget(
+        'recipes-list-favorited-cold', 'get',
+        '/api/recipes/?is_favorited=1&limit={limit}', 5, cold=True,
+    ),
+    Budget(
+        'recipes-list-filtered-cold', 'get',
+        '/api/recipes/?cooking_time_max=30&ingredients=1,2'
+        '&exclude_ingredients=1000000&limit={limit}', 5, cold=True,
+    ),
+    Budget(
+        'recipes-list-popular-cold', 'get',
+        '/api/recipes/?ordering=popular&limit={limit}', 6, cold=True,
+    ),
+    Budget(
+        'recipes-list-included-cold', 'get',
+        '/api/recipes/?include=author,tags,ingredients&limit={limit}', 5,
+        cold=True,
+    ),
+    Budget(
+        'recipes-pantry-cold', 'post', '/api/recipes/pantry/', 4,
+        data={'ingredients': [1, 2, 3], 'limit': 50}, warmup=True,
+        cold=True,
+    ),
+    Budget(
+        'recipes-detail-cold', 'get', '/api/recipes/{recipe}/', 4, cold=True,
+    ),
+    Budget(
+        'recipes-feed-cold', 'get', '/api/recipes/feed/?limit={limit}', 6,
+        cold=True,
+    ),
+    Budget(
+        'recipes-download-shopping-cart', 'get',
+        '/api/recipes/download_shopping_cart/', 2,
+    ),
+    Budget('users-list', 'get', '/api/users/?limit={limit}', 3),
+    Budget('users-detail', 'get', '/api/users/{author}/', 2),
+    Budget('users-me', 'get', '/api/users/me/', 1),
+    Budget(
+        'users-subscriptions', 'get',
+        '/api/users/subscriptions/?recipes_limit=3&limit={limit}', 5,
+    ),
+    Budget('ingredients-list', 'get', '/api/ingredients/?name=а', 1),
+    Budget('tags-list', 'get', '/api/tags/', 1),
+    Budget('favorite-create', 'post', '/api/recipes/{recipe}/favorite/', 5),
+    Budget(
+        'favorite-delete', 'delete', '/api/recipes/{recipe}/favorite/', 4,
+    ),
+    Budget(
+        'shopping-cart-create', 'post',
+        '/api/recipes/{recipe}/shopping_cart/', 5,
+    ),
+    Budget(
+        'shopping-cart-delete', 'delete',
+        '/api/recipes/{recipe}/shopping_cart/', 4,
+    ),
+    Budget('subscribe-create', 'post', '/api/users/{author}/subscribe/', 8),
+    Budget(
+        'subscribe-delete', 'delete', '/api/users/{author}/subscribe/', 5,
+    ),
+    Budget('admin-recipes', 'get', '/admin/app/recipe/', 5),
+    Budget(
+        'admin-recipes-search', 'get', '/admin/app/recipe/?q={prefix}', 5,
+    ),
+    # Три ингредиента и два тега рецепта: по запросу на строку формы.
+    Budget(
+        'admin-recipe-change', 'get', '/admin/app/recipe/{recipe}/change/',
+        12,
+    ),
+    Budget(
+        'admin-recipe-autocomplete', 'get',
+        '/admin/autocomplete/?app_label=app&model_name=favorite'
+        '&field_name=recipe&term={prefix}', 4,
+    ),
+    Budget('admin-compositions', 'get', '/admin/app/composition/', 4),
+    Budget('admin-taglists', 'get', '/admin/app/taglist/', 5),
+    Budget('admin-favorites', 'get', '/admin/app/favorite/', 4),
+    Budget(
+        'admin-favorites-search', 'get',
+        '/admin/app/favorite/?q={prefix}_viewer', 4,
+    ),
+    Budget('admin-shopping-carts', 'get', '/admin/app/shoppingcart/', 4),
+    Budget('admin-users', 'get', '/admin/users/user/', 4),
+    Budget('admin-follows', 'get', '/admin/users/follow/', 4),
+)
+
+
+def create_fixtures(prefix, size=max(PAGE_SIZES)):
+    """
+    Данные для проверки: зритель подписан на size авторов,
+    у каждого по рецепту с тремя ингредиентами и двумя тегами;
+    все рецепты у зрителя в избранном и в корзине.
+    Имена пользователей и рецептов начинаются с prefix, чтобы
+    не совпасть с настоящими данными.
+    Возвращает зрителя, автора без подписки и все рецепты;
+    последний рецепт - вне избранного.
+    """
+    DataGenerator(users=0, recipes=0).ensure_reference_data()
+    ingredients = list(Ingredient.objects.order_by('pk')[:3])
+    tags = list(Tag.objects.order_by('pk')[:2])
+    viewer = User.objects.create_user(
+        username=f'{prefix}_viewer', email=f'{prefix}_viewer@example.com',
+        first_name='Budget', last_name='Viewer',
+        is_staff=True, is_superuser=True,
+    )
+    authors = User.objects.bulk_create(
+        User(username=f'{prefix}_author{index}',
+             email=f'{prefix}_author{index}@example.com',
+             first_name='Budget', last_name='Author')
+        for index in range(size + 1)
+    )
+    if not all(author.pk for author in authors):
+        # Не все БД возвращают id после bulk_create.
+        authors = list(User.objects.filter(
+            username__startswith=f'{prefix}_author'
+        ).order_by('pk'))
+    recipes = [
+        Recipe.objects.create(
+            name=f'{prefix} {author.pk}', text='text',
+            cooking_time=10, author=author,
+        )
+        for author in authors
+    ]
+    Composition.objects.bulk_create(
+        Composition(recipe=recipe, ingredient=ingredient, amount=1)
+        for recipe in recipes for ingredient in ingredients
+    )
+    TagList.objects.bulk_create(
+        TagList(recipe=recipe, tag=tag) for recipe in recipes for tag in tags
+    )
+    followed, spare_author = authors[:-1], authors[-1]
+    Follow.objects.bulk_create(
+        Follow(user=viewer, author=author) for author in followed
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=viewer, recipe=recipe) for recipe in recipes[:-1]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=viewer, recipe=recipe) for recipe in recipes[:-1]
+    )
+    feed.process_events(len(recipes))
+    return viewer, spare_author, recipes
+
+
+def measure(client, budget, context):
+    """Выполняем запрос и возвращаем ответ и список SQL."""
+    url = budget.url.format(**context)
+    # Первый запрос прогревает кэши процесса, его не считаем.
+    if budget.warmup:
+        getattr(client, budget.method)(url, budget.data, format='json')
+    bus.poll(force=True)
+    with override_settings(CACHES=COLD_CACHES) if budget.cold else (
+        nullcontext()
+    ):
+        if budget.cold:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, budget.method)(
+                url, budget.data, format='json'
+            )
+    # Проверка идет внутри транзакции, поэтому atomic в коде API дает
+    # точки сохранения вместо BEGIN/COMMIT, которые в запросы не попадают.
+    return response, [
+        query['sql'] for query in queries.captured_queries
+        if not query['sql'].startswith(SAVEPOINT_SQL)
+    ]
+
+
+def page_size(response):
+    """Число элементов на странице ответа списка."""
+    return len(response.json()['results'])
+
+
+def check_budgets(budgets=BUDGETS):
+    """
+    Проверяем бюджеты на свежих данных.
+    Возвращаем список (имя, размер страницы, число запросов, SQL, ошибка).
+    Данные удаляет откат транзакции, а фрагменты их рецептов
+    в общем кэше удаляются здесь: после отката id рецептов
+    достанутся новым рецептам.
+    """
+    prefix = f'budget_{secrets.token_hex(4)}'
+    viewer, author, recipes = create_fixtures(prefix)
+    recipe_ids = [recipe.pk for recipe in recipes]
+    client = APIClient(SERVER_NAME='localhost')
+    client.credentials(
+        HTTP_AUTHORIZATION=f'Token {AccessToken.for_user(viewer)}'
+    )
+    admin_client = APIClient(SERVER_NAME='localhost')
+    admin_client.force_login(viewer)
+    results = []
+    try:
+        for budget in budgets:
+            counts = {}
+            for limit in PAGE_SIZES if budget.paged else (None,):
+                response, queries = measure(
+                    admin_client if budget.admin else client, budget, {
+                        'recipe': recipes[-1].pk, 'author': author.pk,
+                        'prefix': prefix, 'limit': limit,
+                    },
+                )
+                counts[limit] = len(queries)
+                error = None
+                if response.status_code >= 400:
+                    error = f'status {response.status_code}'
+                elif budget.paged and page_size(response) != limit:
+                    # На короткой странице постоянство числа запросов
+                    # ничего не доказывает.
+                    error = (
+                        f'{page_size(response)} items on page, '
+                        f'expected {limit}'
+                    )
+                elif len(queries) > budget.max_queries:
+                    error = f'{len(queries)} > {budget.max_queries} queries'
+                elif budget.paged and len(set(counts.values())) > 1:
+                    error = f'query count depends on page size: {counts}'
+                results.append(
+                    (budget.name, limit, len(queries), queries, error)
+                )
+    finally:
+        fragments.forget(Recipe.objects.filter(pk__in=recipe_ids))
+    return results
@@ -0,0 +1,211 @@
+"""
+Планы горячих запросов API в PostgreSQL.
+Запросы строятся тем же кодом, что и в view (фильтры, аннотации),
+и проверяются через EXPLAIN: таблицы больше min_rows строк
+должны читаться по индексу, а не последовательным проходом.
+Проверять имеет смысл на данных боевого размера, например
+generate_data --users 100000 --recipes 1000000, после ANALYZE.
+"""
+import json
+
+from django.db import connections
+from django.db.models import Count, Sum
+from django.test import RequestFactory
+
+from api.filters import IngredientFilter, RecipeFilter
+from api.views import (
+    limited_recipes_prefetch, recipes_with_relations, users_with_subscription,
+)
+from app.models import Composition, Favorite, Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+# Узлы плана, которые читают таблицу по индексу.
+INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+class HotQuery:
+    """Горячий запрос: build(context) возвращает QuerySet."""
+
+    def __init__(self, name, build):
+        self.name = name
+        self.build = build
+
+
+def _recipe_filter(context, **data):
+    request = RequestFactory().get('/')
+    request.user = context['viewer']
+    return RecipeFilter(
+        data=data,
+        queryset=recipes_with_relations(context['viewer']),
+        request=request,
+    ).qs
+
+
+def _subscriptions(context):
+    return User.objects.filter(
+        following__user=context['viewer']
+    ).order_by('id')
+
+
+def recipes_list(context):
+    return recipes_with_relations(context['viewer'])[:10]
+
+
+def recipes_list_author(context):
+    return _recipe_filter(context, author=context['author'].pk)[:10]
+
+
+def recipes_list_tag(context):
+    return _recipe_filter(context, tags=context['tag'].slug)[:10]
+
+
+def recipes_list_favorited(context):
+    return _recipe_filter(context, is_favorited=True)[:10]
+
+
+def recipes_list_quick(context):
+    return _recipe_filter(context, cooking_time_max=30)[:10]
+
+
+def recipes_list_ingredient(context):
+    return _recipe_filter(
+        context, ingredients=str(context['ingredient'].pk)
+    )[:10]
+
+
+def recipes_list_without_ingredient(context):
+    return _recipe_filter(
+        context, exclude_ingredients=str(context['ingredient'].pk)
+    )[:10]
+
+
+def recipes_list_popular(context):
+    return _recipe_filter(context, ordering='popular').values('pk')[:1000]
+
+
+def ingredients_search(context):
+    return IngredientFilter(
+        data={'name': context['ingredient'].name[:2]},
+        queryset=Ingredient.objects.all(),
+    ).qs
+
+
+def users_subscriptions(context):
+    return users_with_subscription(
+        _subscriptions(context), context['viewer']
+    )[:10]
+
+
+def users_subscriptions_recipes(context):
+    authors = list(_subscriptions(context).values_list('pk', flat=True)[:10])
+    return limited_recipes_prefetch(3).queryset.filter(author__in=authors)
+
+
+def author_followers(context):
+    return Follow.objects.filter(
+        author=context['author']
+    ).values_list('user_id', flat=True)
+
+
+def favorites_recount(context):
+    return Favorite.objects.filter(
+        recipe_id__in=context['recipe_ids']
+    ).values('recipe').annotate(total=Count('pk'))
+
+
+def shopping_cart_download(context):
+    return Composition.objects.filter(
+        recipe__is_in_shopping_cart__user=context['viewer']
+    ).values(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(amount=Sum('amount'))
+
+
+HOT_QUERIES = (
+    HotQuery('recipes-list', recipes_list),
+    HotQuery('recipes-list-author', recipes_list_author),
+    HotQuery('recipes-list-tag', recipes_list_tag),
+    HotQuery('recipes-list-favorited', recipes_list_favorited),
+    HotQuery('recipes-list-quick', recipes_list_quick),
+    HotQuery('recipes-list-ingredient', recipes_list_ingredient),
+    HotQuery(
+        'recipes-list-no-ingredient', recipes_list_without_ingredient
+    ),
+    HotQuery('recipes-list-popular', recipes_list_popular),
+    HotQuery('ingredients-search', ingredients_search),
+    HotQuery('users-subscriptions', users_subscriptions),
+    HotQuery('users-subscriptions-recipes', users_subscriptions_recipes),
+    HotQuery('author-followers', author_followers),
+    HotQuery('favorites-recount', favorites_recount),
+    HotQuery('shopping-cart-download', shopping_cart_download),
+)
+
+
+def explain(queryset):
+    """План запроса в виде словаря EXPLAIN (FORMAT JSON)."""
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from walk(child)
+
+
+def table_sizes(using):
+    """Оценка числа строк таблиц из статистики (pg_class.reltuples)."""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'"
+        )
+        return dict(cursor.fetchall())
+
+
+def sample_context():
+    """Зритель с подписками, популярный автор, тег, ингредиент."""
+    viewer = User.objects.annotate(
+        follows=Count('follower')
+    ).order_by('-follows', 'pk').first()
+    author = User.objects.order_by('-followers_count', 'pk').first()
+    return {
+        'viewer': viewer,
+        'author': author,
+        'tag': Tag.objects.order_by('pk').first(),
+        'ingredient': Ingredient.objects.order_by('pk').first(),
+        'recipe_ids': list(Recipe.objects.order_by(
+            '-favorites_count', '-id'
+        ).values_list('pk', flat=True)[:100]),
+    }
+
+
+def check_plans(queries=HOT_QUERIES, min_rows=10000):
+    """
+    Список (имя, использованные индексы, таблицы без индекса, план).
+    Таблица без индекса - последовательный проход по таблице
+    больше min_rows строк.
+    """
+    context = sample_context()
+    sizes = None
+    results = []
+    for query in queries:
+        queryset = query.build(context)
+        if sizes is None:
+            sizes = table_sizes(queryset.db)
+        plan = explain(queryset)
+        indexes, seq_scans = [], []
+        for node in walk(plan):
+            if node['Node Type'] in INDEX_SCANS:
+                indexes.append(node['Index Name'])
+            elif node['Node Type'] == 'Seq Scan':
+                table = node['Relation Name']
+                if sizes.get(table, 0) >= min_rows:
+                    seq_scans.append(table)
+        results.append((query.name, indexes, seq_scans, plan))
+    return results
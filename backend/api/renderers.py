@@ -0,0 +1,87 @@
+"""
+Быстрые рендереры и парсеры: JSON через orjson и MessagePack
+(application/msgpack, выбирается по Accept, Content-Type или ?format=).
+Без orjson JSON рендерится и разбирается стандартными классами DRF,
+без msgpack формат не подключается (см. REST_FRAMEWORK в настройках).
+"""
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Ключи словарей included (api/sideload.py) - целые числа.
+ORJSON_OPTIONS = 0 if orjson is None else orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """Ленивые строки, Decimal, UUID и прочее - как в JSONRenderer DRF."""
+    return encoders.JSONEncoder().default(value)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson, вывод совпадает со стандартным."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or self.get_indent(
+            accepted_media_type or '', renderer_context or {}
+        ):
+            # Отступы (Accept: application/json; indent=4) - редкий
+            # отладочный случай, orjson умеет только два пробела.
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        if data is None:
+            return b''
+        ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        # Как и DRF, экранируем разделители строк для встраивания в JS.
+        return ret.replace(
+            '\u2028'.encode(), b'\\u2028'
+        ).replace('\u2029'.encode(), b'\\u2029')
+
+
+class ORJSONParser(JSONParser):
+    """JSONParser на orjson: тело запроса разбирается без декодирования."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get(
+            'encoding', settings.DEFAULT_CHARSET
+        )
+        if orjson is None or encoding.lower() not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+
+
+class MessagePackParser(BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, TypeError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
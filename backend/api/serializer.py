@@ -4,19 +4,25 @@ from rest_framework.validators import UniqueValidator
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db.models import F, prefetch_related_objects
 from djoser.serializers import (
     UserSerializer, UserCreateSerializer
 )
 
+from api.fieldsets import SparseFieldsetSerializerMixin
+from api.sideload import INCLUDABLE
 from users.validators import UsernameRegexValidator
-from users.models import User
+from users.models import Follow, User
+from app import changes, fragments
 from app.models import (
     Recipe, Ingredient, Tag,
     Favorite, ShoppingCart, TagList,
     Composition,
 )
-from foodgram_backend.settings import MIN_AMOUNT, MIN_COOKING_TIME
+from app.cache import ingredient_cache, tag_cache
+from foodgram_backend.settings import (
+    MIN_AMOUNT, MIN_COOKING_TIME, PANTRY_MAX_INGREDIENTS, PANTRY_MAX_RESULTS,
+)
 
 
 class CustomUserCreate(UserCreateSerializer):
@@ -40,7 +46,7 @@ class CustomLoginSerializer(TokenObtainPairSerializer):
         return data
 
 
-class CustomUsersSerializer(UserSerializer):
+class CustomUsersSerializer(SparseFieldsetSerializerMixin, UserSerializer):
     """Сериализатор для пользователей."""
     username = serializers.CharField(
         max_length=150,
@@ -64,6 +70,10 @@ class CustomUsersSerializer(UserSerializer):
         """Получаем информацию о подписи на пользователя."""
         if self.context['request'].user.is_anonymous:
             return False
+        # Во view queryset уже аннотирован подпиской, чтобы не делать
+        # отдельный запрос на каждого пользователя.
+        if hasattr(obj, 'subscribed'):
+            return obj.subscribed
         return obj.following.filter(user=self.context['request'].user).exists()
 
 
@@ -86,19 +96,6 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit',)
 
 
-class CompositionSerializer(serializers.ModelSerializer):
-    """Сериализатор ингредиентов для рецепта."""
-    name = serializers.CharField(source='ingredient.name')
-    measurement_unit = serializers.CharField(
-        source='ingredient.measurement_unit'
-    )
-    id = serializers.IntegerField(source='ingredient.id')
-
-    class Meta:
-        model = Composition
-        fields = ('id', 'name', 'measurement_unit', 'amount')
-
-
 class TagSerializer(serializers.ModelSerializer):
     """Сериализатор тэгов."""
     name = serializers.CharField(read_only=True)
@@ -110,6 +107,23 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug',)
 
 
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Поле связи, которое ищет объекты в кэше справочника, а не в БД."""
+
+    def __init__(self, reference_cache, **kwargs):
+        self.reference_cache = reference_cache
+        kwargs.setdefault('queryset', reference_cache.model.objects.all())
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = self.reference_cache.get(data)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
 class Base64ImageField(serializers.ImageField):
     """Функция преобразования из шифрованной строки в картинку."""
     def to_internal_value(self, data):
@@ -157,23 +171,183 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
                             'cooking_time', 'user', 'recipe',)
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
-    """Сериализатор рецептов list и retreive."""
+class RecipeFragmentListSerializer(serializers.ListSerializer):
+    """Список рецептов: фрагменты всей страницы читаются из кэша разом."""
+
+    def to_representation(self, data):
+        recipes = list(data.all() if hasattr(data, 'all') else data)
+        self.child.load_fragments(recipes)
+        self.child.included = {}
+        representation = super().to_representation(recipes)
+        if self.context.get('include') is not None:
+            # Собранные по странице объекты для ?include= (api/sideload.py).
+            self.included = self.child.included
+        return representation
+
+
+class RecipeListSerializer(SparseFieldsetSerializerMixin,
+                           serializers.ModelSerializer):
+    """
+    Сериализатор рецептов list и retreive.
+    Теги, ингредиенты и автор собираются из фрагмента (app/fragments.py),
+    остальные поля - из строки рецепта и ее аннотаций.
+    Поля задают только состав и порядок ответа, значения считает
+    to_representation методами get_*.
+    """
+    FRAGMENT_FIELDS = {'tags', 'author', 'ingredients'}
+
     image = Base64ImageField(required=False, allow_null=True)
     is_in_shopping_cart = serializers.SerializerMethodField(read_only=True)
     is_favorited = serializers.SerializerMethodField(read_only=True)
-    tags = TagSerializer(many=True, required=True)
-    author = CustomUsersSerializer(read_only=True)
-    ingredients = CompositionSerializer(
-        source='composition',
-        many=True,
-        required=True,
-    )
+    tags = serializers.SerializerMethodField(read_only=True)
+    author = serializers.SerializerMethodField(read_only=True)
+    ingredients = serializers.SerializerMethodField(read_only=True)
+
+    def load_fragments(self, recipes):
+        """Фрагменты нужны, только если запрошено одно из их полей."""
+        self._fragments = {}
+        if self.FRAGMENT_FIELDS & set(self.fields):
+            self._fragments = fragments.get_many(
+                recipes, self.build_fragments
+            )
+
+    def build_fragments(self, recipes):
+        """Фрагменты рецептов, которых нет в кэше."""
+        prefetch_related_objects(recipes, 'author', 'tags', 'composition')
+        return {
+            recipe.pk: {
+                'tags': [tag.pk for tag in recipe.tags.all()],
+                'author': {
+                    'username': recipe.author.username,
+                    'email': recipe.author.email,
+                    'first_name': recipe.author.first_name,
+                    'last_name': recipe.author.last_name,
+                    'id': recipe.author.pk,
+                },
+                'ingredients': [
+                    (item.ingredient_id, item.amount)
+                    for item in recipe.composition.all()
+                ],
+            }
+            for recipe in recipes
+        }
+
+    def fragment(self, recipe):
+        fragment = getattr(self, '_fragments', {}).get(recipe.pk)
+        if fragment is None:
+            self.load_fragments([recipe])
+            fragment = self._fragments[recipe.pk]
+        return fragment
+
+    def tag_representations(self, tag_ids):
+        """Теги из кэша справочника, каждый сериализуется один раз."""
+        if not hasattr(self, '_tags'):
+            self._tags = {
+                tag.pk: TagSerializer(tag).data for tag in tag_cache.all()
+            }
+        return [self._tags[pk] for pk in tag_ids if pk in self._tags]
+
+    def ingredient_representations(self, items):
+        sideloaded = self.sideloaded('ingredients')
+        ingredients = []
+        for ingredient_id, amount in items:
+            ingredient = ingredient_cache.get(ingredient_id)
+            if ingredient is None:
+                continue
+            representation = {
+                'id': ingredient_id,
+                'name': ingredient.name,
+                'measurement_unit': ingredient.measurement_unit,
+            }
+            if sideloaded:
+                # Количество свое у каждого рецепта, остается в рецепте.
+                self.include(
+                    'ingredients', ingredient_id, lambda: representation
+                )
+                representation = {'id': ingredient_id}
+            ingredients.append({**representation, 'amount': amount})
+        return ingredients
+
+    def image_url(self, recipe):
+        if not recipe.image:
+            return None
+        return self.context['request'].build_absolute_uri(recipe.image.url)
+
+    def sideloaded(self, name):
+        """Поле отдается id, а объект - в included (?include=)."""
+        include = self.context.get('include')
+        return include is not None and name in include
+
+    def include(self, name, pk, build):
+        """Кладем объект в included, если его там еще нет, и отдаем id."""
+        if not hasattr(self, 'included'):
+            self.included = {}
+        objects = self.included.setdefault(INCLUDABLE[name], {})
+        if pk not in objects:
+            objects[pk] = build()
+        return pk
+
+    def get_tags(self, recipe):
+        tags = self.tag_representations(self.fragment(recipe)['tags'])
+        if not self.sideloaded('tags'):
+            return tags
+        return [
+            self.include('tags', tag['id'], lambda: tag) for tag in tags
+        ]
+
+    def get_author(self, recipe):
+        def build():
+            return {
+                **self.fragment(recipe)['author'],
+                'is_subscribed': self.get_author_subscribed(recipe),
+            }
+
+        if not self.sideloaded('author'):
+            return build()
+        return self.include('author', recipe.author_id, build)
+
+    def get_ingredients(self, recipe):
+        return self.ingredient_representations(
+            self.fragment(recipe)['ingredients']
+        )
+
+    def to_representation(self, recipe):
+        # Считаем только запрошенные поля (?fields=, ?omit=): для
+        # остальных view не загружает данные.
+        values = {
+            'id': lambda: recipe.pk,
+            'tags': lambda: self.get_tags(recipe),
+            'author': lambda: self.get_author(recipe),
+            'ingredients': lambda: self.get_ingredients(recipe),
+            'is_favorited': lambda: self.get_is_favorited(recipe),
+            'is_in_shopping_cart': lambda: self.get_is_in_shopping_cart(
+                recipe
+            ),
+            'name': lambda: recipe.name,
+            'image': lambda: self.image_url(recipe),
+            'text': lambda: recipe.text,
+            'cooking_time': lambda: recipe.cooking_time,
+            'favorites_count': lambda: recipe.favorites_count,
+        }
+        return {name: values[name]() for name in self.fields}
+
+    def get_author_subscribed(self, recipe):
+        """Подписан ли текущий пользователь на автора рецепта."""
+        user = self.context['request'].user
+        if user.is_anonymous:
+            return False
+        if hasattr(recipe, 'author_subscribed'):
+            return recipe.author_subscribed
+        return Follow.objects.filter(
+            user=user, author_id=recipe.author_id
+        ).exists()
 
     def get_is_favorited(self, recipe):
         """Рецепт в избранном или нет."""
         if self.context['request'].user.is_anonymous:
             return False
+        if hasattr(recipe, 'favorited'):
+            return recipe.favorited
         user = self.context['request'].user
         return recipe.is_favorited.filter(user=user).exists()
 
@@ -181,6 +355,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         """Рецепт в корзине или нет."""
         if self.context['request'].user.is_anonymous:
             return False
+        if hasattr(recipe, 'in_shopping_cart'):
+            return recipe.in_shopping_cart
         user = self.context['request'].user
         return recipe.is_in_shopping_cart.filter(user=user).exists()
 
@@ -189,18 +365,19 @@ class RecipeListSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time',
+            'name', 'image', 'text', 'cooking_time', 'favorites_count',
         )
-        read_only_fields = ('author',)
+        read_only_fields = ('author', 'favorites_count')
+        list_serializer_class = RecipeFragmentListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для создания/обновления рецепта."""
     image = Base64ImageField(required=False, allow_null=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = CachedPrimaryKeyRelatedField(
+        tag_cache,
         required=True,
         many=True,
-        queryset=Tag.objects.all(),
     )
     ingredients = serializers.ListField(
         child=serializers.DictField(required=True),
@@ -232,6 +409,10 @@ class RecipeSerializer(serializers.ModelSerializer):
                     'В рецепте есть повторяющиеся ингредиенты'
                 )
             reply_check[ingredient['id']] = ingredient['amount']
+            if ingredient_cache.get(ingredient['id']) is None:
+                raise serializers.ValidationError(
+                    f'Ингредиента с id {ingredient["id"]} не существует'
+                )
             if int(ingredient['amount']) < MIN_AMOUNT:
                 raise serializers.ValidationError(
                     [{'amount': [(
@@ -255,20 +436,21 @@ class RecipeSerializer(serializers.ModelSerializer):
         Composition.objects.bulk_create(
             [Composition(
                 recipe=recipe,
-                ingredient=get_object_or_404(
-                    Ingredient,
-                    pk=ingredient_info['id']
-                ),
+                ingredient=ingredient_cache.get(ingredient_info['id']),
                 amount=ingredient_info['amount'],
             ) for ingredient_info in ingredients]
         )
+        changes.record([recipe.pk])
         return recipe
 
     def update(self, recipe, validated_data):
         """Обновление рецепта."""
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        Recipe.objects.filter(pk=recipe.id).update(**validated_data)
+        # Новая версия рецепта: закэшированный фрагмент больше не читается.
+        Recipe.objects.filter(pk=recipe.id).update(
+            **validated_data, version=F('version') + 1
+        )
         # Сперва удалим все привязки тегов
         TagList.objects.filter(recipe=recipe).delete()
         # Добавим теги вновь
@@ -284,13 +466,12 @@ class RecipeSerializer(serializers.ModelSerializer):
         Composition.objects.bulk_create(
             [Composition(
                 recipe=recipe,
-                ingredient=get_object_or_404(
-                    Ingredient,
-                    pk=ingredient_info['id']
-                ),
+                ingredient=ingredient_cache.get(ingredient_info['id']),
                 amount=ingredient_info['amount'],
             ) for ingredient_info in ingredients]
         )
+        recipe.refresh_from_db()
+        changes.record([recipe.pk])
         return recipe
 
     class Meta:
@@ -317,6 +498,8 @@ class SubscriptionsSerializer(CustomUsersSerializer):
 
     def get_recipes(self, obj):
         """Рецепты с лимитированием."""
+        if hasattr(obj, 'limited_recipes'):
+            return SmallRecipeSerializer(obj.limited_recipes, many=True).data
         limit = self.context['request'].query_params.get('recipes_limit', None)
         queryset = Recipe.objects.filter(author=obj).all()
         if limit:
@@ -324,8 +507,8 @@ class SubscriptionsSerializer(CustomUsersSerializer):
         return SmallRecipeSerializer(queryset, many=True).data
 
     def get_recipes_count(self, obj):
-        """Количество рецептов."""
-        return obj.recipes.count()
+        """Количество рецептов (счетчик, см. app/counters.py)."""
+        return obj.recipes_count
 
     class Meta:
         model = User
@@ -334,3 +517,15 @@ class SubscriptionsSerializer(CustomUsersSerializer):
             'last_name', 'id', 'is_subscribed',
             'recipes', 'recipes_count',
         )
+
+
+class PantrySerializer(serializers.Serializer):
+    """Продукты для поиска рецептов (/api/recipes/pantry/)."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS,
+    )
+    limit = serializers.IntegerField(
+        min_value=1, max_value=PANTRY_MAX_RESULTS, default=10,
+    )
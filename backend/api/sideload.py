@@ -0,0 +1,58 @@
+"""
+Нормализованный ответ: ?include=author,tags заменяет вложенные объекты
+в рецептах на их id, а сами объекты отдает один раз в верхнеуровневом
+словаре included: {"authors": {id: автор}, "tags": {id: тег}}.
+С include=ingredients в рецепте остаются id и количество ингредиента.
+"""
+from rest_framework.exceptions import ValidationError
+
+from api.fieldsets import split_names
+
+INCLUDE_PARAM = 'include'
+# Поле рецепта -> ключ словаря included.
+INCLUDABLE = {
+    'author': 'authors', 'tags': 'tags', 'ingredients': 'ingredients',
+}
+
+
+def with_included(response, data):
+    """Добавляем в ответ словари, собранные сериализатором списка data."""
+    included = getattr(getattr(data, 'serializer', None), 'included', None)
+    if included is not None:
+        response.data['included'] = included
+    return response
+
+
+class SideloadViewMixin:
+    """?include= для действий sideload_actions (страницы списков)."""
+    sideload_actions = ('list',)
+
+    def get_include(self):
+        """Поля, которые отдаются через included, или None."""
+        if not hasattr(self, '_include'):
+            self._include = self.parse_include()
+        return self._include
+
+    def parse_include(self):
+        if self.request is None or self.action not in self.sideload_actions:
+            return None
+        if INCLUDE_PARAM not in self.request.query_params:
+            return None
+        include = split_names(self.request.query_params[INCLUDE_PARAM])
+        unknown = include - set(INCLUDABLE)
+        if unknown:
+            raise ValidationError({
+                INCLUDE_PARAM: 'Неизвестные поля: {}. Доступны: {}'.format(
+                    ', '.join(sorted(unknown)), ', '.join(INCLUDABLE)
+                )
+            })
+        return include
+
+    def get_serializer_context(self):
+        return {
+            **super().get_serializer_context(),
+            'include': self.get_include(),
+        }
+
+    def get_paginated_response(self, data):
+        return with_included(super().get_paginated_response(data), data)
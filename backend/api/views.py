@@ -8,8 +8,9 @@ from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.decorators import action
 from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
-from django.http import FileResponse
-from django.db.models import Sum
+from django.http import FileResponse, Http404
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Prefetch, Subquery, Sum
 
 from reportlab.pdfgen import canvas
 from reportlab.pdfbase import pdfmetrics
@@ -21,19 +22,80 @@ from api.serializer import (
     IngredientSerializer, TagSerializer, CustomLoginSerializer,
     CustomUserCreate, RecipeSerializer,
     FavoriteSerializer, ShoppingCartSerializer, SubscriptionsSerializer,
+    PantrySerializer,
 )
 from api.permission import IsAuthor
+from api.fieldsets import FIELDS_PARAM, OMIT_PARAM, SparseFieldsetViewMixin
 from api.filters import RecipeFilter, IngredientFilter
-from api.pagination import CustomPageNumberPagination
+from api.sideload import INCLUDE_PARAM, SideloadViewMixin, with_included
+from api.pagination import CustomPageNumberPagination, KeysetPagination
 from users.models import User, Follow
+from users.revocation import revocation_list
 from app.models import (
-    Recipe, Ingredient, Tag, Favorite, ShoppingCart, Composition
+    Recipe, Ingredient, Tag, Favorite, ShoppingCart, Composition,
+    RecipeNeighbour,
 )
+from app import changes, counters, feed
+from app.cache import ingredient_cache, tag_cache
+from app.pantry import pantry_index
 from foodgram_backend.settings import (
     PDFSettings, SHOPPING_CART_FILENAME, BASE_DIR
 )
 
 
+def users_with_subscription(queryset, user):
+    """Аннотируем пользователей признаком подписки текущего пользователя."""
+    if user.is_anonymous:
+        return queryset
+    return queryset.annotate(subscribed=Exists(
+        Follow.objects.filter(user=user, author=OuterRef('pk'))
+    ))
+
+
+def recipes_with_relations(user, fieldset=None):
+    """
+    Рецепты с признаками текущего пользователя для RecipeListSerializer.
+    Общая для всех часть рецепта (теги, ингредиенты, автор) берется
+    из кэша фрагментов, поэтому здесь ее не загружаем.
+    Если задан fieldset, аннотируем только нужное для этих полей.
+    """
+    def wants(name):
+        return fieldset is None or name in fieldset
+
+    queryset = Recipe.objects.all()
+    if not wants('text'):
+        queryset = queryset.defer('text')
+    if user.is_anonymous:
+        return queryset
+    annotations = {
+        'favorited': ('is_favorited', Exists(
+            Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+        )),
+        'in_shopping_cart': ('is_in_shopping_cart', Exists(
+            ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+        )),
+        'author_subscribed': ('author', Exists(
+            Follow.objects.filter(user=user, author=OuterRef('author'))
+        )),
+    }
+    return queryset.annotate(**{
+        name: expression
+        for name, (field, expression) in annotations.items() if wants(field)
+    })
+
+
+def limited_recipes_prefetch(limit):
+    """Последние limit рецептов каждого автора одним запросом."""
+    recipes = Recipe.objects.all()
+    if limit:
+        recipes = recipes.filter(pk__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).values('pk')[:int(limit)]
+        ))
+    return Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+
+
 class CustomLoginView(TokenObtainPairView):
     """View класс входа в приложение."""
     permission_classes = (permissions.AllowAny,)
@@ -44,13 +106,28 @@ class CustomLogoutView(TokenDestroyView):
     """View класс выхода из приложения."""
     permission_classes = (permissions.IsAuthenticated,)
 
+    def post(self, request):
+        """Отзываем JWT токен, с которым пришел запрос."""
+        if request.auth is not None:
+            revocation_list.revoke(request.auth, request.user)
+        return super().post(request)
+
 
-class CustomUsersViewSet(UserViewSet):
+class CustomUsersViewSet(SparseFieldsetViewMixin, UserViewSet):
     """View-crud класс для пользователя(ей)."""
     queryset = User.objects.all()
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = CustomPageNumberPagination
     search_fields = ('username', )
     filter_backends = (DjangoFilterBackend, filters.SearchFilter)
+    fieldset_actions = ('list', 'retrieve', 'me', 'subscriptions')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if (self.action in ('list', 'retrieve')
+                and self.wants('is_subscribed')):
+            return users_with_subscription(queryset, self.request.user)
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -71,7 +148,15 @@ class CustomUsersViewSet(UserViewSet):
     @action(methods=('get',), detail=False)
     def subscriptions(self, request):
         """Подписки пользователя."""
-        queryset = User.objects.filter(following__user=request.user).all()
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).order_by('id')
+        if self.wants('is_subscribed'):
+            queryset = users_with_subscription(queryset, request.user)
+        if self.wants('recipes'):
+            queryset = queryset.prefetch_related(limited_recipes_prefetch(
+                request.query_params.get('recipes_limit', None)
+            ))
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -101,7 +186,10 @@ class SubscribesViewSet(viewsets.GenericViewSet,
                 'Ошибка подписки',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        Follow.objects.create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.create(user=request.user, author=author)
+            counters.increment(User, author.pk, 'followers_count')
+        feed.backfill(request.user, author)
         serializer = self.get_serializer(author)
         return Response(serializer.data)
 
@@ -121,14 +209,18 @@ class SubscribesViewSet(viewsets.GenericViewSet,
                 'Ошибка отписки',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        queryset.delete()
+        with transaction.atomic():
+            deleted, _ = queryset.delete()
+            counters.increment(User, author.pk, 'followers_count', -deleted)
+        feed.remove_author(request.user, author)
         return Response(
             'Успешная отписка',
             status=status.HTTP_204_NO_CONTENT
         )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(SideloadViewMixin, SparseFieldsetViewMixin,
+                    viewsets.ModelViewSet):
     """View-crud класс для рецептов."""
     queryset = Recipe.objects.all()
     serializer_class = RecipeListSerializer
@@ -137,10 +229,51 @@ class RecipeViewSet(viewsets.ModelViewSet):
     permission_classes = (permissions.IsAuthenticatedOrReadOnly, IsAuthor)
     pagination_class = CustomPageNumberPagination
     http_method_names = ('get', 'post', 'delete', 'patch')
+    fieldset_actions = ('list', 'retrieve', 'feed')
+    sideload_actions = ('list', 'feed')
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve', 'feed', 'pantry', 'similar'):
+            return recipes_with_relations(
+                self.request.user, self.get_fieldset()
+            )
+        return super().get_queryset()
+
+    def is_popular_only(self):
+        """Запрошены только популярные рецепты, без других фильтров."""
+        params = self.request.query_params
+        return params.get('ordering') == 'popular' and not set(params) - {
+            'ordering', self.paginator.page_query_param,
+            self.paginator.page_size_query_param,
+            FIELDS_PARAM, OMIT_PARAM, INCLUDE_PARAM,
+        }
+
+    def list(self, request, *args, **kwargs):
+        """
+        Первые POPULAR_CACHE_SIZE популярных рецептов берем из кэша id,
+        следующие страницы и остальные списки - обычным запросом.
+        """
+        if not self.is_popular_only():
+            return super().list(request, *args, **kwargs)
+        ids = self.paginate_queryset(counters.PopularRecipeIds())
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids if pk in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
 
+    @transaction.atomic
     def perform_create(self, serializer):
         """Возвращаем полученный рецепт."""
-        return serializer.save(author=self.request.user)
+        recipe = serializer.save(author=self.request.user)
+        counters.increment(User, self.request.user.pk, 'recipes_count')
+        return recipe
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        changes.record([instance.pk])
+        instance.delete()
+        counters.increment(User, instance.author_id, 'recipes_count', -1)
 
     def create(self, request, *args, **kwargs):
         """Создаем рецепт с подменой сериализатора на возврат."""
@@ -158,6 +291,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
             headers=headers
         )
 
+    @transaction.atomic
     def perform_update(self, serializer):
         """Возвращаем полученный рецепт."""
         return serializer.save()
@@ -179,10 +313,90 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def get_serializer_class(self):
         """Меняем сериализатор в зависимости от запроса."""
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed', 'pantry', 'similar'):
             return RecipeListSerializer
         return RecipeSerializer
 
+    @action(
+        methods=('get',), detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        paginator = KeysetPagination()
+        limit = paginator.get_limit(request)
+        ids = feed.recipe_ids(
+            request.user, paginator.get_before(request), limit + 1
+        )
+        next_key = ids[limit - 1] if len(ids) > limit else None
+        recipes = self.get_queryset().in_bulk(ids[:limit])
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in ids[:limit] if pk in recipes], many=True
+        )
+        data = serializer.data
+        return with_included(
+            paginator.get_paginated_response(request, data, next_key), data
+        )
+
+    @action(
+        methods=('post',), detail=False,
+        permission_classes=(permissions.AllowAny,),
+    )
+    def pantry(self, request):
+        """
+        Что приготовить из имеющихся продуктов: рецепты с наименьшим
+        числом недостающих ингредиентов (индекс app/pantry.py).
+        """
+        serializer = PantrySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = pantry_index.search(
+            serializer.validated_data['ingredients'],
+            serializer.validated_data['limit'],
+        )
+        recipes = self.get_queryset().in_bulk(
+            [pk for pk, _, _ in results]
+        )
+        results = [
+            (recipes[pk], matched, missing)
+            for pk, matched, missing in results if pk in recipes
+        ]
+        data = self.get_serializer(
+            [recipe for recipe, _, _ in results], many=True
+        ).data
+        return Response([
+            {**item, 'matched_count': matched, 'missing_count': missing}
+            for item, (_, matched, missing) in zip(data, results)
+        ])
+
+    @action(methods=('get',), detail=True)
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты по ингредиентам и тегам, посчитанные
+        заранее командой similar_recipes (app/similar.py).
+        """
+        neighbours = list(RecipeNeighbour.objects.filter(
+            recipe_id=pk
+        ).order_by('-score', '-neighbour_id').values_list(
+            'neighbour_id', 'score'
+        ))
+        if not neighbours:
+            get_object_or_404(Recipe, pk=pk)
+        recipes = self.get_queryset().in_bulk(
+            [neighbour_id for neighbour_id, _ in neighbours]
+        )
+        # Удаленные рецепты остаются в таблице до пересчета.
+        neighbours = [
+            (recipes[neighbour_id], score)
+            for neighbour_id, score in neighbours if neighbour_id in recipes
+        ]
+        data = self.get_serializer(
+            [recipe for recipe, _ in neighbours], many=True
+        ).data
+        return Response([
+            {**item, 'similarity': round(score, 3)}
+            for item, (_, score) in zip(data, neighbours)
+        ])
+
     @action(methods=('get',), detail=False)
     def download_shopping_cart(self, request):
         """Список покупок в формате pdf."""
@@ -228,7 +442,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
 
 
-class IngredientViewSet(viewsets.GenericViewSet,
+class ReferenceCacheMixin:
+    """Получение объекта справочника из кэша, без запроса к БД."""
+    reference_cache = None
+
+    def get_object(self):
+        obj = self.reference_cache.get(self.kwargs[self.lookup_field])
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class IngredientViewSet(ReferenceCacheMixin,
+                        viewsets.GenericViewSet,
                         viewsets.mixins.ListModelMixin,
                         viewsets.mixins.RetrieveModelMixin,
                         ):
@@ -239,9 +466,11 @@ class IngredientViewSet(viewsets.GenericViewSet,
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     permission_classes = (permissions.AllowAny,)
+    reference_cache = ingredient_cache
 
 
-class TagViewSet(viewsets.GenericViewSet,
+class TagViewSet(ReferenceCacheMixin,
+                 viewsets.GenericViewSet,
                  viewsets.mixins.ListModelMixin,
                  viewsets.mixins.RetrieveModelMixin,):
     """View-crud класс для тегов."""
@@ -249,6 +478,11 @@ class TagViewSet(viewsets.GenericViewSet,
     serializer_class = TagSerializer
     pagination_class = None
     permission_classes = (permissions.AllowAny,)
+    reference_cache = tag_cache
+
+    def get_queryset(self):
+        """Список тегов отдаем из кэша справочника."""
+        return self.reference_cache.all()
 
 
 class FavoriteViewSet(viewsets.GenericViewSet,
@@ -266,7 +500,9 @@ class FavoriteViewSet(viewsets.GenericViewSet,
                 'Ошибка создания рецепта',
             )
         recipe = get_object_or_404(Recipe, pk=pk)
-        serializer.save(user=self.request.user, recipe=recipe)
+        with transaction.atomic():
+            serializer.save(user=self.request.user, recipe=recipe)
+            counters.increment(Recipe, recipe.pk, 'favorites_count')
 
     def create(self, request, *args, **kwargs):
         pk = kwargs.get('id', None)
@@ -303,7 +539,9 @@ class FavoriteViewSet(viewsets.GenericViewSet,
                 'Рецепта нет в списке избранного',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        queryset.delete()
+        with transaction.atomic():
+            deleted, _ = queryset.delete()
+            counters.increment(Recipe, pk, 'favorites_count', -deleted)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -322,7 +560,9 @@ class ShoppingCartViewSet(viewsets.GenericViewSet,
                 'Ошибка поиска рецепта',
             )
         recipe = get_object_or_404(Recipe, pk=pk)
-        serializer.save(user=self.request.user, recipe=recipe)
+        with transaction.atomic():
+            serializer.save(user=self.request.user, recipe=recipe)
+            counters.increment(Recipe, recipe.pk, 'in_carts_count')
 
     def create(self, request, *args, **kwargs):
         pk = kwargs.get('id', None)
@@ -360,7 +600,9 @@ class ShoppingCartViewSet(viewsets.GenericViewSet,
                 'Рецепта нет в списке покупок',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        queryset.delete()
+        with transaction.atomic():
+            deleted, _ = queryset.delete()
+            counters.increment(Recipe, pk, 'in_carts_count', -deleted)
         return Response(
             'Рецепт удален из корзины',
             status=status.HTTP_204_NO_CONTENT
@@ -1,26 +1,214 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.template.response import TemplateResponse
+from django.urls import path
 
+from app import changes, fragments
 from app.models import (
     Ingredient, Tag, Recipe, TagList, Composition,
     ShoppingCart, Favorite,
 )
 from app.constants import EMPTY_FIELD_VALUE
+from app.exchange import (
+    FavoriteResource, Importer, ImportFormatError, IngredientResource,
+    RecipeResource, ShoppingCartResource, export_response, read_rows,
+)
+from foodgram_backend.admin_utils import ScaledModelAdmin
+from foodgram_backend.settings import XLSX_EXPORT_MAX_ROWS
+
+EXCHANGE_FORMATS = (('csv', 'CSV'), ('xlsx', 'XLSX'), ('json', 'JSON'))
+
+
+class ImportForm(forms.Form):
+    file = forms.FileField(label='Файл')
+    file_format = forms.ChoiceField(label='Формат', choices=EXCHANGE_FORMATS)
+    dry_run = forms.BooleanField(
+        label='Пробный прогон (ничего не записывать)',
+        required=False, initial=True,
+    )
+
+
+class ExchangeAdminMixin:
+    """
+    Выгрузка выбранных строк действиями списка и загрузка файла
+    по ссылке «Загрузить» (см. app/exchange.py).
+    """
+    resource_class = None
+    change_list_template = 'admin/exchange_change_list.html'
+    actions = ('export_csv', 'export_xlsx', 'export_json')
+
+    def export(self, queryset, file_format):
+        return export_response(
+            self.resource_class(), queryset, file_format,
+            self.model._meta.model_name,
+        )
+
+    @admin.action(description='Выгрузить в CSV')
+    def export_csv(self, request, queryset):
+        return self.export(queryset, 'csv')
+
+    @admin.action(description='Выгрузить в XLSX')
+    def export_xlsx(self, request, queryset):
+        # XLSX не отдается потоком: большие выгрузки - в CSV или JSON.
+        if queryset[:XLSX_EXPORT_MAX_ROWS + 1].count() > XLSX_EXPORT_MAX_ROWS:
+            self.message_user(
+                request,
+                f'В XLSX можно выгрузить не больше {XLSX_EXPORT_MAX_ROWS} '
+                'строк, выгрузите в CSV или JSON.',
+                messages.ERROR,
+            )
+            return None
+        return self.export(queryset, 'xlsx')
+
+    @admin.action(description='Выгрузить в JSON')
+    def export_json(self, request, queryset):
+        return self.export(queryset, 'json')
+
+    def get_urls(self):
+        opts = self.model._meta
+        return [
+            path(
+                'import/',
+                self.admin_site.admin_view(self.import_view),
+                name=f'{opts.app_label}_{opts.model_name}_import',
+            ),
+            *super().get_urls(),
+        ]
+
+    def import_view(self, request):
+        if not (self.has_add_permission(request)
+                and self.has_change_permission(request)):
+            raise PermissionDenied
+        report = None
+        form = ImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            importer = Importer(
+                self.resource_class(), dry_run=form.cleaned_data['dry_run']
+            )
+            try:
+                report = importer.run(read_rows(
+                    form.cleaned_data['file'],
+                    form.cleaned_data['file_format'],
+                ))
+            except ImportFormatError as error:
+                form.add_error('file', str(error))
+        return TemplateResponse(request, 'admin/exchange_import.html', {
+            **self.admin_site.each_context(request),
+            'title': f'Загрузка: {self.model._meta.verbose_name_plural}',
+            'opts': self.model._meta,
+            'form': form,
+            'report': report,
+            'columns': self.resource_class().columns,
+        })
+
+
+class RecipePartAdminMixin:
+    """
+    Изменение тегов и ингредиентов рецепта меняет его версию
+    и попадает в журнал изменений рецептов.
+    """
+
+    def recipes_changed(self, recipe_ids):
+        fragments.bump(recipe_ids)
+        changes.record(recipe_ids)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.recipes_changed([obj.recipe_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recipes_changed([obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = set(queryset.values_list('recipe_id', flat=True))
+        super().delete_queryset(request, queryset)
+        self.recipes_changed(recipe_ids)
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class CookingTimeFilter(admin.SimpleListFilter):
+    """
+    Фильтр по времени готовки диапазонами: список всех значений
+    потребовал бы SELECT DISTINCT по всей таблице рецептов.
+    """
+    title = 'Время приготовления'
+    parameter_name = 'cooking_time'
+    ranges = {
+        'fast': ('до 15 минут', None, 15),
+        'medium': ('от 16 до 60 минут', 16, 60),
+        'long': ('больше часа', 61, None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, title) for key, (title, _, _) in self.ranges.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        _, low, high = self.ranges[self.value()]
+        if low is not None:
+            queryset = queryset.filter(cooking_time__gte=low)
+        if high is not None:
+            queryset = queryset.filter(cooking_time__lte=high)
+        return queryset
+
+
+class CompositionInline(admin.TabularInline):
+    """Ингредиенты рецепта с выбором через поиск."""
+    model = Composition
+    autocomplete_fields = ('ingredient',)
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
+
+
+class TagListInline(admin.TabularInline):
+    """Теги рецепта."""
+    model = TagList
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
+
+
+class RecipeAdmin(ExchangeAdminMixin, ScaledModelAdmin):
     """Админка для рецептов."""
+    resource_class = RecipeResource
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'name', 'text', 'cooking_time',
                     'pub_date', 'author',)
-    list_editable = ('author', 'cooking_time',)
-    search_fields = (
-        'name', 'author__email', 'author__username'
-    )
-    list_filter = ('pub_date', 'cooking_time', 'tags')
+    list_editable = ('cooking_time',)
+    list_select_related = ('author',)
+    list_filter = ('pub_date', CookingTimeFilter, 'tags')
+    # Порядок по первичному ключу не требует сортировки всей таблицы.
+    ordering = ('-pk',)
+    autocomplete_fields = ('author',)
+    inlines = (CompositionInline, TagListInline)
+    search_id_fields = ('pk',)
+    search_prefix_fields = ('name',)
+    search_user_fields = ('author',)
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        fragments.bump([form.instance.pk])
+        changes.record([form.instance.pk])
+
+    def delete_model(self, request, obj):
+        changes.record([obj.pk])
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        changes.record(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ExchangeAdminMixin, admin.ModelAdmin):
     """Админка для ингредиентов."""
+    resource_class = IngredientResource
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'name', 'measurement_unit',)
     search_fields = ('name',)
@@ -34,44 +222,45 @@ class TagAdmin(admin.ModelAdmin):
     search_fields = ('name', 'slug',)
 
 
-class CompositionAdmin(admin.ModelAdmin):
+class CompositionAdmin(RecipePartAdminMixin, ScaledModelAdmin):
     """Админка для ингредиентов в составе рецепта."""
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'recipe', 'ingredient', 'amount')
-    search_fields = (
-        'recipe__name', 'recipe__author__email', 'recipe__author__username'
-    )
-    list_filter = ('recipe__tags',)
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    search_id_fields = ('recipe',)
 
 
-class TagListAdmin(admin.ModelAdmin):
+class TagListAdmin(RecipePartAdminMixin, ScaledModelAdmin):
     """Админка для тегов у рецепта."""
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'recipe', 'tag',)
-    search_fields = (
-        'recipe__name', 'recipe__author__email', 'recipe__author__username'
-    )
+    list_select_related = ('recipe', 'tag')
+    autocomplete_fields = ('recipe',)
+    search_id_fields = ('recipe',)
     list_filter = ('tag',)
 
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(ExchangeAdminMixin, ScaledModelAdmin):
     """Админка корзины покупок"""
+    resource_class = ShoppingCartResource
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'user', 'recipe')
-    search_fields = (
-        'recipe__name', 'recipe__author__email', 'recipe__author__username'
-    )
-    list_filter = ('recipe__tags',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_id_fields = ('recipe',)
+    search_user_fields = ('user',)
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(ExchangeAdminMixin, ScaledModelAdmin):
     """Админка избранного"""
+    resource_class = FavoriteResource
     empty_value_display = EMPTY_FIELD_VALUE
     list_display = ('pk', 'user', 'recipe')
-    search_fields = (
-        'recipe__name', 'recipe__author__email', 'recipe__author__username'
-    )
-    list_filter = ('recipe__tags',)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_id_fields = ('recipe',)
+    search_user_fields = ('user',)
 
 
 admin.site.register(Recipe, RecipeAdmin)
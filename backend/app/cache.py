@@ -0,0 +1,76 @@
+import threading
+
+from django.db import DEFAULT_DB_ALIAS
+
+from app.invalidation import bus
+from app.models import Ingredient, Tag
+
+
+class ReferenceCache:
+    """
+    Кэш справочной таблицы в памяти процесса (id -> объект).
+    Локальная копия сбрасывается сигналами post_save/post_delete,
+    а остальные процессы узнают об изменениях через шину сброса кэшей.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.namespace = f'reference:{model._meta.label_lower}'
+        self._lock = threading.Lock()
+        self._objects = None
+        self._generation = 0
+        bus.subscribe(self.namespace, self.clear)
+
+    def __deepcopy__(self, memo):
+        # Поля сериализаторов копируются при каждом запросе,
+        # а кэш должен оставаться общим на весь процесс.
+        return self
+
+    def _get_objects(self):
+        """Актуальная карта объектов, при необходимости перечитанная."""
+        bus.poll()
+        objects = self._objects
+        if objects is None:
+            with self._lock:
+                objects = self._objects
+                if objects is None:
+                    generation = self._generation
+                    # Читаем из основной БД, чтобы не закэшировать
+                    # отстающие данные реплики.
+                    objects = {
+                        obj.pk: obj for obj in
+                        self.model.objects.using(DEFAULT_DB_ALIAS)
+                    }
+                    # Если кэш сбросили во время чтения, не сохраняем
+                    # возможно устаревшие данные.
+                    if generation == self._generation:
+                        self._objects = objects
+        return objects
+
+    def get(self, pk):
+        """Объект по первичному ключу или None."""
+        try:
+            return self._get_objects().get(int(pk))
+        except (TypeError, ValueError):
+            return None
+
+    def all(self):
+        """Все объекты в порядке сортировки модели."""
+        return list(self._get_objects().values())
+
+    def clear(self):
+        """
+        Сбрасываем локальную копию. Под блокировкой: сброс во время
+        загрузки дождется ее и выбросит загруженные данные.
+        """
+        with self._lock:
+            self._generation += 1
+            self._objects = None
+
+    def invalidate(self):
+        """Сбрасываем кэш во всех процессах."""
+        bus.publish(self.namespace)
+
+
+tag_cache = ReferenceCache(Tag)
+ingredient_cache = ReferenceCache(Ingredient)
@@ -0,0 +1,75 @@
+"""
+Журнал изменений состава рецептов (модель RecipeChange).
+Запись делается в той же транзакции, что и изменение, а остальные
+процессы узнают о ней через шину сброса кэшей и читают только
+непрочитанные записи (app/watermark.py).
+"""
+from datetime import timedelta
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from app.invalidation import bus
+from app.models import RecipeChange
+from app.watermark import Watermark
+from foodgram_backend.settings import RECIPE_CHANGE_TTL
+
+NAMESPACE = 'app:recipe_change'
+
+
+def record(recipe_ids):
+    """Отмечаем, что у рецептов изменились ингредиенты или теги."""
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    RecipeChange.objects.bulk_create(
+        RecipeChange(recipe_id=recipe_id) for recipe_id in recipe_ids
+    )
+    RecipeChange.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=RECIPE_CHANGE_TTL)
+    ).delete()
+    bus.publish(NAMESPACE)
+
+
+def last_id():
+    """Id последней записи журнала (0, если журнал пуст)."""
+    change = RecipeChange.objects.using(DEFAULT_DB_ALIAS).order_by(
+        '-id'
+    ).values_list('id', flat=True).first()
+    return change or 0
+
+
+def first_id():
+    """
+    Id самой старой записи журнала (0, если журнал пуст). Если она
+    больше прочитанной + 1, старые записи уже удалены по TTL.
+    """
+    change = RecipeChange.objects.using(DEFAULT_DB_ALIAS).order_by(
+        'id'
+    ).values_list('id', flat=True).first()
+    return change or 0
+
+
+def watermark(change_id=None, read_at=None):
+    """
+    Метка чтения журнала (app/watermark.py): прочитан до записи
+    change_id в момент read_at. По умолчанию - журнал прочитан
+    до конца: метку берем до полной загрузки данных, и изменения,
+    сделанные во время загрузки, применятся еще раз.
+    """
+    if change_id is None:
+        change_id, read_at = last_id(), timezone.now()
+    return Watermark('created_at', last_id=change_id, read_at=read_at)
+
+
+def since(watermark):
+    """
+    Рецепты, измененные после прошлого чтения журнала по watermark.
+    Читаем из основной БД: запись, которой еще нет на реплике,
+    была бы пропущена.
+    """
+    return {
+        recipe_id for _, recipe_id in watermark.read(
+            RecipeChange.objects.using(DEFAULT_DB_ALIAS), 'recipe_id'
+        )
+    }
@@ -0,0 +1,114 @@
+"""
+Денормализованные счетчики: популярность рецептов и авторов.
+Эндпоинты меняют их атомарно через F(), а reconcile исправляет
+расхождения (например, после удаления пользователя через админку).
+"""
+from django.apps import apps as global_apps
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from app.models import Recipe
+from foodgram_backend.settings import POPULAR_CACHE_SIZE, POPULAR_CACHE_TTL
+
+# (модель, счетчик, модель связи, поле связи с моделью)
+COUNTERS = (
+    ('app.Recipe', 'favorites_count', 'app.Favorite', 'recipe'),
+    ('app.Recipe', 'in_carts_count', 'app.ShoppingCart', 'recipe'),
+    ('users.User', 'recipes_count', 'app.Recipe', 'author'),
+    ('users.User', 'followers_count', 'users.Follow', 'author'),
+)
+POPULAR_CACHE_KEY = 'recipes:popular'
+
+
+def increment(model, pk, field, delta=1):
+    """Атомарно меняем счетчик, не опускаясь ниже нуля."""
+    if delta:
+        model.objects.filter(pk=pk).update(
+            **{field: Greatest(F(field) + delta, 0)}
+        )
+
+
+def actual_count(related, field):
+    """Подзапрос с настоящим числом связанных строк."""
+    return Coalesce(Subquery(
+        related._base_manager.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def reconcile(apps=global_apps, dry_run=False):
+    """
+    Пересчитываем разошедшиеся счетчики одним UPDATE на счетчик.
+    Возвращаем {счетчик: число исправленных (или найденных) строк}.
+    """
+    fixed = {}
+    for model_label, field, related_label, related_field in COUNTERS:
+        model = apps.get_model(model_label)
+        actual = actual_count(apps.get_model(related_label), related_field)
+        drifted = model._base_manager.exclude(**{field: actual})
+        fixed[f'{model_label}.{field}'] = (
+            drifted.count() if dry_run
+            else drifted.update(**{field: actual})
+        )
+    return fixed
+
+
+def recount(model, field, pks):
+    """Пересчитываем счетчик field у строк model с id из pks."""
+    label = model._meta.label
+    for model_label, counter, related_label, related_field in COUNTERS:
+        if (model_label, counter) == (label, field):
+            related = global_apps.get_model(related_label)
+            return model._base_manager.filter(pk__in=pks).update(
+                **{field: actual_count(related, related_field)}
+            )
+    raise ValueError(f'Нет счетчика {label}.{field}')
+
+
+def _popular_ids():
+    return Recipe.objects.order_by(
+        '-favorites_count', '-id'
+    ).values_list('pk', flat=True)
+
+
+def popular_recipe_ids():
+    """
+    Id POPULAR_CACHE_SIZE самых популярных рецептов
+    (по индексу recipe_popular_idx), кэш на POPULAR_CACHE_TTL секунд.
+    """
+    ids = cache.get(POPULAR_CACHE_KEY)
+    if ids is None:
+        ids = list(_popular_ids()[:POPULAR_CACHE_SIZE])
+        cache.set(POPULAR_CACHE_KEY, ids, POPULAR_CACHE_TTL)
+    return ids
+
+
+class PopularRecipeIds:
+    """
+    Id всех рецептов по популярности для пагинатора. Первые
+    POPULAR_CACHE_SIZE - список из кэша, за ним - запросом по индексу
+    recipe_popular_idx остальные рецепты, кроме рецептов этого списка.
+    Поэтому страницы по обе стороны границы не повторяют и не
+    пропускают рецепты, даже если популярность изменилась после
+    заполнения кэша. count() - настоящее число рецептов.
+    """
+
+    def count(self):
+        return Recipe.objects.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        ids = popular_recipe_ids()
+        result = ids[start:stop]
+        if stop is not None and stop <= len(ids):
+            return result
+        return result + list(_popular_ids().exclude(pk__in=ids)[
+            max(start - len(ids), 0):
+            None if stop is None else stop - len(ids)
+        ])
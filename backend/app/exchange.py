@@ -0,0 +1,422 @@
+"""
+Выгрузка и загрузка таблиц через админку (CSV, XLSX, JSON).
+Выгрузка CSV и JSON отдается потоком и читает строки из БД порциями
+(.iterator(chunk_size=...)), поэтому не держит таблицу в памяти.
+XLSX - это zip, он собирается до отправки, поэтому ограничен
+XLSX_EXPORT_MAX_ROWS строками.
+Загрузка читает файл и пишет в БД порциями и умеет пробный прогон:
+показывает, какие строки будут добавлены и изменены, ничего
+не записывая.
+"""
+import csv
+import io
+import itertools
+import json
+import tempfile
+import zipfile
+from collections import Counter
+from json.decoder import WHITESPACE
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from app import counters, fragments
+from app.cache import ingredient_cache
+from app.models import Favorite, Ingredient, Recipe, ShoppingCart
+from foodgram_backend.settings import (
+    EXPORT_CHUNK_SIZE, IMPORT_BATCH_SIZE, IMPORT_DIFF_LIMIT,
+    XLSX_EXPORT_MAX_ROWS,
+)
+
+# Сколько символов JSON читать из файла загрузки за раз.
+JSON_READ_SIZE = 64 * 1024
+
+
+class ImportFormatError(Exception):
+    """Файл загрузки не читается или в нем нет нужных колонок."""
+
+
+class Resource:
+    """
+    Описание таблицы для обмена.
+    fields - колонки выгрузки (пути для values_list);
+    key - колонки, по которым загрузка находит существующую строку;
+    import_fields - колонки, которые загрузка меняет у найденных строк.
+    Если update_only, строки с новым ключом считаются ошибкой.
+    recount - счетчики (модель, счетчик, колонка с id), которые
+    пересчитываются для затронутых загрузкой строк.
+    """
+    model = None
+    fields = ()
+    key = ()
+    import_fields = ()
+    update_only = False
+    recount = ()
+
+    @property
+    def columns(self):
+        return (*self.key, *self.import_fields)
+
+    def rows(self, queryset):
+        return queryset.order_by('pk').values_list(*self.fields).iterator(
+            chunk_size=EXPORT_CHUNK_SIZE
+        )
+
+    def after_import(self, created, updated):
+        """Действия после записи порции строк."""
+        for model_label, field, column in self.recount:
+            counters.recount(
+                apps.get_model(model_label), field,
+                {row[column] for row in itertools.chain(created, updated)},
+            )
+
+
+class IngredientResource(Resource):
+    model = Ingredient
+    fields = ('id', 'name', 'measurement_unit')
+    key = ('name', 'measurement_unit')
+
+    def after_import(self, created, updated):
+        super().after_import(created, updated)
+        if created or updated:
+            # bulk_create не отправляет сигналы, сбрасываем кэш сами.
+            ingredient_cache.invalidate()
+
+
+class RecipeResource(Resource):
+    model = Recipe
+    fields = (
+        'id', 'name', 'text', 'cooking_time', 'author_id', 'author__email',
+        'pub_date', 'favorites_count', 'in_carts_count',
+    )
+    key = ('id',)
+    import_fields = ('name', 'text', 'cooking_time')
+    # Новый рецепт требует ингредиентов и тегов, загрузка только правит.
+    update_only = True
+
+    def after_import(self, created, updated):
+        super().after_import(created, updated)
+        fragments.bump([row['pk'] for row in updated])
+
+
+class FavoriteResource(Resource):
+    model = Favorite
+    fields = ('id', 'user_id', 'user__email', 'recipe_id', 'recipe__name')
+    key = ('user_id', 'recipe_id')
+    recount = (('app.Recipe', 'favorites_count', 'recipe_id'),)
+
+
+class ShoppingCartResource(Resource):
+    model = ShoppingCart
+    fields = ('id', 'user_id', 'user__email', 'recipe_id', 'recipe__name')
+    key = ('user_id', 'recipe_id')
+    recount = (('app.Recipe', 'in_carts_count', 'recipe_id'),)
+
+
+def _cell(value):
+    return '' if value is None else value
+
+
+class _Echo:
+    """Буфер для csv.writer, который сразу возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def _stream_csv(resource, queryset):
+    writer = csv.writer(_Echo())
+    yield '\ufeff'  # BOM, чтобы Excel открыл файл в UTF-8
+    yield writer.writerow(resource.fields)
+    for row in resource.rows(queryset):
+        yield writer.writerow([_cell(value) for value in row])
+
+
+def _stream_json(resource, queryset):
+    yield '['
+    separator = '\n'
+    for row in resource.rows(queryset):
+        yield separator + json.dumps(
+            dict(zip(resource.fields, row)),
+            ensure_ascii=False, default=str,
+        )
+        separator = ',\n'
+    yield '\n]\n'
+
+
+def export_response(resource, queryset, file_format, filename):
+    """
+    Ответ с выгрузкой queryset в формате csv, json или xlsx.
+    Число строк XLSX проверяет вызывающий код (XLSX_EXPORT_MAX_ROWS),
+    лишние строки отбрасываются.
+    """
+    attachment = f'attachment; filename="{filename}.{file_format}"'
+    if file_format == 'xlsx':
+        # XLSX - это zip, его нельзя отдавать по мере записи. Книга
+        # в режиме write_only сбрасывает строки во временный файл.
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(resource.model._meta.model_name)
+        sheet.append(resource.fields)
+        for row in itertools.islice(
+            resource.rows(queryset), XLSX_EXPORT_MAX_ROWS
+        ):
+            sheet.append([
+                str(value) if hasattr(value, 'isoformat') else value
+                for value in row
+            ])
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return FileResponse(
+            output, as_attachment=True,
+            filename=f'{filename}.xlsx',
+        )
+    stream, content_type = {
+        'csv': (_stream_csv, 'text/csv; charset=utf-8'),
+        'json': (_stream_json, 'application/json; charset=utf-8'),
+    }[file_format]
+    response = StreamingHttpResponse(
+        stream(resource, queryset), content_type=content_type
+    )
+    response['Content-Disposition'] = attachment
+    return response
+
+
+def _csv_rows(upload):
+    yield from csv.DictReader(io.TextIOWrapper(upload, 'utf-8-sig'))
+
+
+def _json_rows(upload):
+    """
+    Объекты JSON-списка по одному: файл читается порциями
+    по JSON_READ_SIZE символов, а не целиком.
+    """
+    decoder = json.JSONDecoder()
+    text = io.TextIOWrapper(upload, 'utf-8-sig')
+    buffer, position = '', 0
+
+    def peek():
+        """Следующий символ после пробелов ('' в конце файла)."""
+        nonlocal buffer, position
+        while True:
+            position = WHITESPACE.match(buffer, position).end()
+            if position < len(buffer):
+                return buffer[position]
+            buffer, position = text.read(JSON_READ_SIZE), 0
+            if not buffer:
+                return ''
+
+    if peek() != '[':
+        raise ImportFormatError('JSON должен быть списком объектов')
+    position += 1
+    if peek() == ']':
+        position += 1
+    else:
+        while True:
+            peek()
+            while True:
+                try:
+                    row, position = decoder.raw_decode(buffer, position)
+                    break
+                except ValueError as error:
+                    # Объект мог не поместиться в прочитанную часть.
+                    chunk = text.read(JSON_READ_SIZE)
+                    if not chunk:
+                        raise ImportFormatError(
+                            f'Некорректный JSON: {error}'
+                        )
+                    buffer, position = buffer[position:] + chunk, 0
+            if not isinstance(row, dict):
+                raise ImportFormatError('JSON должен быть списком объектов')
+            yield row
+            separator = peek()
+            position += 1
+            if separator == ']':
+                break
+            if separator != ',':
+                raise ImportFormatError(
+                    'Некорректный JSON: ожидалась запятая или ]'
+                )
+    if peek():
+        raise ImportFormatError('Некорректный JSON: данные после списка')
+
+
+def _xlsx_rows(upload):
+    try:
+        sheet = load_workbook(upload, read_only=True).active
+    except KeyError as error:
+        # В zip нет частей книги.
+        raise ImportFormatError(f'Некорректный XLSX: {error}')
+    values = sheet.iter_rows(values_only=True)
+    header = [str(name) for name in next(values, ())]
+    for row in values:
+        yield dict(zip(header, row))
+
+
+READERS = {'csv': _csv_rows, 'json': _json_rows, 'xlsx': _xlsx_rows}
+
+
+def read_rows(upload, file_format):
+    """
+    Строки загруженного файла как словари {колонка: значение}.
+    Все форматы читаются по строке. Испорченный файл или файл
+    не в UTF-8 - ImportFormatError.
+    """
+    if file_format not in READERS:
+        raise ImportFormatError(f'Неизвестный формат {file_format}')
+    try:
+        yield from READERS[file_format](upload)
+    except UnicodeDecodeError as error:
+        raise ImportFormatError(f'Файл не в кодировке UTF-8: {error}')
+    except csv.Error as error:
+        raise ImportFormatError(f'Некорректный CSV: {error}')
+    except (zipfile.BadZipFile, InvalidFileException) as error:
+        raise ImportFormatError(f'Некорректный XLSX: {error}')
+
+
+class ImportReport:
+    """Итог загрузки: число строк по действиям и первые отличия."""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.totals = Counter()
+        self.diff = []
+
+    def add(self, line, action, key, changes=None):
+        self.totals[action] += 1
+        if action != 'skip' and len(self.diff) < IMPORT_DIFF_LIMIT:
+            self.diff.append((line, action, key, changes or {}))
+
+
+class Importer:
+    """Загрузка строк файла в таблицу ресурса порциями."""
+
+    def __init__(self, resource, dry_run=True):
+        self.resource = resource
+        self.model = resource.model
+        self.report = ImportReport(dry_run)
+        self.seen = set()
+
+    def clean(self, row):
+        """Значения колонок строки, приведенные к типам полей модели."""
+        missing = [name for name in self.resource.columns if name not in row]
+        if missing:
+            raise ImportFormatError(
+                f'Нет колонок: {", ".join(missing)}'
+            )
+        cleaned = {}
+        for name in self.resource.columns:
+            field = self.model._meta.get_field(name)
+            value = _cell(row[name])
+            if isinstance(value, str):
+                value = value.strip()
+            if field.is_relation:
+                # Существование связанных строк проверяем сразу для
+                # всей порции (missing_relations), а не по строке.
+                value = field.to_python(value)
+                field.run_validators(value)
+            else:
+                value = field.clean(value, None)
+            cleaned[name] = value
+        return cleaned
+
+    def missing_relations(self, batch):
+        """Значения внешних ключей, которых нет в связанных таблицах."""
+        missing = {}
+        for name in self.resource.columns:
+            field = self.model._meta.get_field(name)
+            if not field.is_relation:
+                continue
+            values = {row[name] for _, row in batch}
+            missing[name] = values - set(
+                field.related_model._base_manager.filter(
+                    pk__in=values
+                ).values_list('pk', flat=True)
+            )
+        return missing
+
+    def existing(self, batch):
+        """Найденные по ключу строки: {ключ: {колонка: значение}}."""
+        key = self.resource.key
+        rows = self.model._base_manager.filter(**{
+            f'{name}__in': {row[name] for _, row in batch} for name in key
+        }).values('pk', *self.resource.columns)
+        return {tuple(row[name] for name in key): row for row in rows}
+
+    def process(self, batch):
+        key_names = self.resource.key
+        missing = self.missing_relations(batch)
+        existing = self.existing(batch)
+        created, updated = [], []
+        for line, row in batch:
+            key = tuple(row[name] for name in key_names)
+            broken = [
+                name for name, values in missing.items()
+                if row[name] in values
+            ]
+            if broken:
+                self.report.add(line, 'error', key, {
+                    name: (row[name], 'не найдено') for name in broken
+                })
+                continue
+            if key in self.seen:
+                self.report.add(line, 'skip', key)
+                continue
+            self.seen.add(key)
+            current = existing.get(key)
+            if current is None:
+                if self.resource.update_only:
+                    self.report.add(line, 'error', key, {
+                        'key': (key, 'строка не найдена'),
+                    })
+                    continue
+                self.report.add(line, 'new', key)
+                created.append(row)
+                continue
+            changes = {
+                name: (current[name], row[name])
+                for name in self.resource.import_fields
+                if current[name] != row[name]
+            }
+            if not changes:
+                self.report.add(line, 'skip', key)
+                continue
+            self.report.add(line, 'update', key, changes)
+            updated.append({**row, 'pk': current['pk']})
+        if self.report.dry_run:
+            return
+        with transaction.atomic():
+            self.model._base_manager.bulk_create(
+                [self.model(**row) for row in created],
+                batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True,
+            )
+            if updated:
+                self.model._base_manager.bulk_update(
+                    [self.model(**row) for row in updated],
+                    self.resource.import_fields,
+                    batch_size=IMPORT_BATCH_SIZE,
+                )
+            self.resource.after_import(created, updated)
+
+    def run(self, rows):
+        """Загружаем строки (словари) и возвращаем ImportReport."""
+        batch = []
+        # Строка 1 - заголовок файла.
+        for line, row in enumerate(rows, start=2):
+            try:
+                batch.append((line, self.clean(row)))
+            except ValidationError as error:
+                self.report.add(line, 'error', None, {
+                    'row': (row, '; '.join(error.messages)),
+                })
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                self.process(batch)
+                batch = []
+        if batch:
+            self.process(batch)
+        self.report.diff.sort(key=lambda item: item[0])
+        return self.report
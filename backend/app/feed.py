@@ -0,0 +1,168 @@
+"""
+Лента подписок с рассылкой при записи.
+Новый рецепт попадает в ленты подписчиков автора фоновым обработчиком
+(команда feed_worker), а лента читается одним проходом по индексу.
+Рецепты авторов-знаменитостей не рассылаются, а подмешиваются при чтении.
+"""
+import itertools
+
+from django.db import transaction
+from django.db.models import Count
+
+from app.models import CelebrityAuthor, FeedEntry, FeedEvent, Recipe
+from foodgram_backend.settings import (
+    FEED_BACKFILL, FEED_BATCH_SIZE, FEED_CELEBRITY_FOLLOWERS,
+    FEED_MAX_ENTRIES,
+)
+from users.models import Follow
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def backfill(user, author, limit=FEED_BACKFILL):
+    """
+    Добавляем в ленту последние рецепты автора после подписки.
+    Рецепты знаменитостей подмешиваются при чтении, их не копируем.
+    """
+    recipe_ids = Recipe.objects.filter(
+        author=author, author__celebrity__isnull=True
+    ).order_by('-pk').values_list('pk', flat=True)[:limit]
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user=user, recipe_id=pk, author=author)
+         for pk in recipe_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_author(user, author):
+    """Убираем из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+def fan_out(recipe_id, author_id):
+    """
+    Рассылаем рецепт по лентам подписчиков автора.
+    Автор, у которого подписчиков не меньше FEED_CELEBRITY_FOLLOWERS,
+    становится знаменитостью, и его рецепты больше не рассылаются.
+    Возвращает число записанных строк.
+    """
+    if CelebrityAuthor.objects.filter(author_id=author_id).exists():
+        return 0
+    followers = Follow.objects.filter(author_id=author_id)
+    if followers.count() >= FEED_CELEBRITY_FOLLOWERS:
+        CelebrityAuthor.objects.get_or_create(author_id=author_id)
+        return 0
+    written = 0
+    user_ids = followers.values_list('user_id', flat=True).iterator(
+        chunk_size=FEED_BATCH_SIZE
+    )
+    for batch in _batches(user_ids, FEED_BATCH_SIZE):
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                       author_id=author_id)
+             for user_id in batch],
+            ignore_conflicts=True,
+        )
+        written += len(batch)
+    return written
+
+
+def process_events(limit=10):
+    """
+    Рассылаем до limit новых рецептов.
+    Несколько обработчиков могут работать параллельно: занятые
+    другими события пропускаются (SKIP LOCKED).
+    Возвращает число обработанных событий.
+    """
+    with transaction.atomic():
+        events = list(FeedEvent.objects.select_for_update(
+            skip_locked=True, of=('self',)
+        ).order_by('pk').values_list(
+            'pk', 'recipe_id', 'recipe__author_id'
+        )[:limit])
+        for _, recipe_id, author_id in events:
+            fan_out(recipe_id, author_id)
+        FeedEvent.objects.filter(
+            pk__in=[pk for pk, _, _ in events]
+        ).delete()
+    return len(events)
+
+
+def trim(max_entries=FEED_MAX_ENTRIES):
+    """Оставляем в каждой ленте только max_entries последних рецептов."""
+    overfull = FeedEntry.objects.values('user').annotate(
+        total=Count('pk')
+    ).filter(total__gt=max_entries).values_list('user', flat=True)
+    trimmed = 0
+    for user_id in overfull.iterator():
+        boundary = FeedEntry.objects.filter(user_id=user_id).order_by(
+            '-recipe_id'
+        ).values_list('recipe_id', flat=True)[max_entries - 1]
+        trimmed += FeedEntry.objects.filter(
+            user_id=user_id, recipe_id__lt=boundary
+        ).delete()[0]
+    return trimmed
+
+
+def rebuild():
+    """
+    Пересобираем все ленты по текущим подпискам, например после
+    загрузки данных в обход сигналов (generate_data).
+    """
+    celebrities = Follow.objects.values('author').annotate(
+        total=Count('pk')
+    ).filter(total__gte=FEED_CELEBRITY_FOLLOWERS).values_list(
+        'author', flat=True
+    )
+    CelebrityAuthor.objects.bulk_create(
+        [CelebrityAuthor(author_id=pk) for pk in celebrities],
+        ignore_conflicts=True,
+    )
+    FeedEntry.objects.all().delete()
+    FeedEvent.objects.all().delete()
+    authors = Follow.objects.exclude(
+        author__celebrity__isnull=False
+    ).values_list('author', flat=True).distinct().order_by('author')
+    for author_id in authors.iterator():
+        recipe_ids = list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-pk').values_list('pk', flat=True)[:FEED_BACKFILL])
+        user_ids = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        entries = (
+            FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+            for user_id in user_ids for recipe_id in recipe_ids
+        )
+        for batch in _batches(entries, FEED_BATCH_SIZE):
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+    trim()
+
+
+def recipe_ids(user, before=None, limit=10):
+    """
+    Id рецептов ленты, новые первыми, строго меньше before.
+    Собственная лента читается обратным проходом по индексу
+    (user, recipe), рецепты знаменитостей - отдельным запросом.
+    """
+    timeline = FeedEntry.objects.filter(user=user)
+    celebrity = Recipe.objects.filter(
+        author__following__user=user,
+        author__celebrity__isnull=False,
+    )
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+        celebrity = celebrity.filter(pk__lt=before)
+    ids = set(timeline.order_by('-recipe_id').values_list(
+        'recipe_id', flat=True
+    )[:limit])
+    ids.update(celebrity.order_by('-pk').values_list('pk', flat=True)[:limit])
+    return sorted(ids, reverse=True)[:limit]
@@ -0,0 +1,59 @@
+"""
+Кэш общей для всех читателей части рецепта (фрагмента).
+Ключ фрагмента - (id рецепта, версия): версия увеличивается при любом
+изменении рецепта, его тегов, ингредиентов или профиля автора,
+поэтому старые фрагменты не сбрасываются, а просто больше не читаются.
+"""
+from django.core.cache import cache
+from django.db.models import F
+
+from app.models import Recipe
+from foodgram_backend.settings import FRAGMENT_CACHE_TTL
+
+KEY_PREFIX = 'recipe:fragment'
+
+
+def fragment_key(recipe):
+    return f'{KEY_PREFIX}:{recipe.pk}:{recipe.version}'
+
+
+def bump(recipe_ids=None, author_id=None):
+    """Увеличиваем версию рецептов recipe_ids или всех рецептов автора."""
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    if author_id is not None:
+        recipes = recipes.filter(author_id=author_id)
+    return recipes.update(version=F('version') + 1)
+
+
+def forget(recipes):
+    """
+    Удаляем из кэша фрагменты рецептов всех версий до текущей:
+    для проверок, которые создают рецепты и откатывают транзакцию.
+    """
+    cache.delete_many([
+        f'{KEY_PREFIX}:{recipe.pk}:{version}'
+        for recipe in recipes for version in range(1, recipe.version + 1)
+    ])
+
+
+def get_many(recipes, build):
+    """
+    Фрагменты рецептов {id: фрагмент} одним запросом к кэшу.
+    Недостающие строятся вызовом build(список рецептов) -> {id: фрагмент}
+    и сохраняются одним set_many.
+    """
+    keys = {fragment_key(recipe): recipe for recipe in recipes}
+    cached = cache.get_many(keys)
+    fragments = {keys[key].pk: fragment for key, fragment in cached.items()}
+    missing = [
+        recipe for key, recipe in keys.items() if key not in cached
+    ]
+    if missing:
+        built = build(missing)
+        cache.set_many({
+            fragment_key(recipe): built[recipe.pk] for recipe in missing
+        }, FRAGMENT_CACHE_TTL)
+        fragments.update(built)
+    return fragments
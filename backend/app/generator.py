@@ -0,0 +1,260 @@
+"""
+Генерация синтетических данных для нагрузочного тестирования.
+При одинаковом seed на пустой БД получается одинаковый набор данных.
+"""
+import csv
+import io
+import itertools
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app import counters
+from app.cache import ingredient_cache, tag_cache
+from app.models import (
+    Composition, Favorite, Ingredient, Recipe, ShoppingCart, Tag, TagList,
+)
+from foodgram_backend.settings import BASE_DIR
+from users.models import Follow, User
+
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F4A7B9', 'dessert'),
+    ('Выпечка', '#C69C6D', 'baking'),
+    ('Вегетарианское', '#7BC47F', 'vegetarian'),
+    ('Быстро', '#FFD400', 'quick'),
+    ('Праздничное', '#D7263D', 'holiday'),
+)
+WORDS = (
+    'домашний', 'быстрый', 'сытный', 'легкий', 'пряный', 'сладкий',
+    'острый', 'нежный', 'хрустящий', 'запеченный', 'томленый', 'летний',
+    'суп', 'салат', 'пирог', 'рагу', 'омлет', 'паста', 'каша', 'плов',
+    'запеканка', 'котлеты', 'блины', 'соус', 'десерт', 'тушеные овощи',
+)
+GENERATED_PASSWORD = 'generated-password'
+
+
+def zipf_cum_weights(size, exponent=1.1):
+    """Накопленные веса распределения Ципфа для random.choices."""
+    return list(itertools.accumulate(
+        1 / (rank ** exponent) for rank in range(1, size + 1)
+    ))
+
+
+class BulkWriter:
+    """
+    Пакетная запись строк в таблицу модели.
+    На PostgreSQL используется COPY, на остальных БД - bulk_create.
+    """
+
+    def __init__(self, model, fields, batch_size):
+        self.model = model
+        self.fields = fields
+        self.batch_size = batch_size
+        self.use_copy = connection.vendor == 'postgresql'
+        self.written = 0
+
+    def _copy(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['' if value is None else value for value in row])
+        buffer.seek(0)
+        columns = ', '.join(
+            connection.ops.quote_name(self.model._meta.get_field(name).column)
+            for name in self.fields
+        )
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f'COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+
+    def _bulk_create(self, rows):
+        attnames = [self.model._meta.get_field(name).attname
+                    for name in self.fields]
+        self.model.objects.bulk_create(
+            [self.model(**dict(zip(attnames, row))) for row in rows],
+            batch_size=self.batch_size,
+        )
+
+    def write(self, rows):
+        """Записываем строки пакетами по batch_size."""
+        rows = iter(rows)
+        while True:
+            batch = list(itertools.islice(rows, self.batch_size))
+            if not batch:
+                break
+            if self.use_copy:
+                self._copy(batch)
+            else:
+                self._bulk_create(batch)
+            self.written += len(batch)
+
+
+class DataGenerator:
+    """Генератор пользователей, рецептов, подписок, избранного и корзин."""
+
+    def __init__(self, users, recipes, seed=0, follows=20, favorites=15,
+                 carts=3, batch_size=10000, log=None):
+        self.users = users
+        self.recipes = recipes
+        self.follows = follows
+        self.favorites = favorites
+        self.carts = carts
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+        self.log = log or (lambda message: None)
+
+    def _next_id(self, model):
+        last = model.objects.order_by('-pk').values_list('pk', flat=True)
+        return (last.first() or 0) + 1
+
+    def _write(self, model, fields, rows):
+        writer = BulkWriter(model, fields, self.batch_size)
+        writer.write(rows)
+        self.log(f'{model._meta.db_table}: {writer.written}')
+
+    def ensure_reference_data(self):
+        """Заполняем ингредиенты и теги, если их еще нет."""
+        if not Ingredient.objects.exists():
+            with open(BASE_DIR / 'data/ingredients.csv',
+                      encoding='utf-8') as source:
+                Ingredient.objects.bulk_create(
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in csv.reader(source)
+                )
+            # bulk_create не отправляет сигналы, сбрасываем кэш сами.
+            ingredient_cache.invalidate()
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in DEFAULT_TAGS
+            )
+            tag_cache.invalidate()
+
+    def _sample(self, population, cum_weights, count):
+        """Уникальная выборка с весами (может быть меньше count)."""
+        return set(self.random.choices(
+            population, cum_weights=cum_weights, k=count
+        ))
+
+    def _user_rows(self, first_id):
+        password = make_password(GENERATED_PASSWORD)
+        joined = timezone.now() - timedelta(days=365)
+        for user_id in range(first_id, first_id + self.users):
+            yield (
+                user_id, password, False, False, True, joined,
+                f'user{user_id}', f'user{user_id}@example.com',
+                f'Имя{user_id}', f'Фамилия{user_id}', 0, 0,
+            )
+
+    def _recipe_rows(self, first_id, authors, author_weights):
+        today = date.today()
+        rnd = self.random
+        for recipe_id in range(first_id, first_id + self.recipes):
+            name = ' '.join(rnd.sample(WORDS, 3)).capitalize()
+            yield (
+                recipe_id,
+                f'{name} #{recipe_id}',
+                ' '.join(rnd.choices(WORDS, k=rnd.randint(20, 60))),
+                min(int(rnd.lognormvariate(3.3, 0.6)) + 1, 600),
+                rnd.choices(authors, cum_weights=author_weights)[0],
+                today - timedelta(days=rnd.randint(0, 3 * 365)),
+                0, 0, 1,
+            )
+
+    def _composition_rows(self, recipe_ids, ingredients, weights):
+        for recipe_id in recipe_ids:
+            count = self.random.randint(3, 12)
+            for ingredient_id in self._sample(ingredients, weights, count):
+                yield recipe_id, ingredient_id, self.random.randint(1, 500)
+
+    def _taglist_rows(self, recipe_ids, tags, weights):
+        for recipe_id in recipe_ids:
+            count = self.random.randint(1, 3)
+            for tag_id in self._sample(tags, weights, count):
+                yield recipe_id, tag_id
+
+    def _user_pairs(self, user_ids, targets, weights, average, exclude_self):
+        """Пары (пользователь, цель) со средним числом average на человека."""
+        for user_id in user_ids:
+            count = min(
+                int(self.random.expovariate(1 / average)) if average else 0,
+                len(targets),
+            )
+            for target in self._sample(targets, weights, count):
+                if not (exclude_self and target == user_id):
+                    yield user_id, target
+
+    def _reset_sequences(self):
+        models = (User, Recipe, Composition, TagList, Follow,
+                  Favorite, ShoppingCart)
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+    @transaction.atomic
+    def generate(self):
+        self.ensure_reference_data()
+        ingredients = list(Ingredient.objects.values_list('pk', flat=True))
+        tags = list(Tag.objects.values_list('pk', flat=True))
+        # Популярность ингредиентов и тегов - случайная перестановка,
+        # чтобы частые ингредиенты не шли подряд по алфавиту.
+        self.random.shuffle(ingredients)
+        self.random.shuffle(tags)
+        ingredient_weights = zipf_cum_weights(len(ingredients))
+        tag_weights = zipf_cum_weights(len(tags), exponent=0.8)
+
+        first_user = self._next_id(User)
+        self._write(User, (
+            'id', 'password', 'is_superuser', 'is_staff', 'is_active',
+            'date_joined', 'username', 'email', 'first_name', 'last_name',
+            'recipes_count', 'followers_count',
+        ), self._user_rows(first_user))
+        user_ids = range(first_user, first_user + self.users)
+        # Немногие авторы пишут большую часть рецептов.
+        authors = list(user_ids)
+        self.random.shuffle(authors)
+        author_weights = zipf_cum_weights(len(authors), exponent=0.9)
+
+        first_recipe = self._next_id(Recipe)
+        self._write(Recipe, (
+            'id', 'name', 'text', 'cooking_time', 'author', 'pub_date',
+            'favorites_count', 'in_carts_count', 'version',
+        ), self._recipe_rows(first_recipe, authors, author_weights))
+        recipe_ids = range(first_recipe, first_recipe + self.recipes)
+        self._write(
+            Composition, ('recipe', 'ingredient', 'amount'),
+            self._composition_rows(
+                recipe_ids, ingredients, ingredient_weights
+            ),
+        )
+        self._write(
+            TagList, ('recipe', 'tag'),
+            self._taglist_rows(recipe_ids, tags, tag_weights),
+        )
+
+        popular_recipes = list(recipe_ids)
+        self.random.shuffle(popular_recipes)
+        recipe_weights = zipf_cum_weights(len(popular_recipes))
+        self._write(Follow, ('user', 'author'), self._user_pairs(
+            user_ids, authors, author_weights, self.follows, True
+        ))
+        self._write(Favorite, ('user', 'recipe'), self._user_pairs(
+            user_ids, popular_recipes, recipe_weights, self.favorites, False
+        ))
+        self._write(ShoppingCart, ('user', 'recipe'), self._user_pairs(
+            user_ids, popular_recipes, recipe_weights, self.carts, False
+        ))
+        self._reset_sequences()
+        # Счетчики считаем по вставленным строкам одним UPDATE на счетчик.
+        counters.reconcile()
@@ -0,0 +1,111 @@
+import threading
+import time
+from collections import defaultdict
+
+from django.db import (
+    DEFAULT_DB_ALIAS, DatabaseError, IntegrityError, transaction,
+)
+from django.db.models import F
+from django.utils import timezone
+
+from app.models import CacheVersion
+from foodgram_backend.settings import INVALIDATION_POLL_INTERVAL
+
+
+class InvalidationBus:
+    """
+    Шина сброса кэшей между процессами.
+    Изменения публикуются увеличением версии пространства имен
+    в таблице CacheVersion. Каждый процесс не чаще, чем раз
+    в INVALIDATION_POLL_INTERVAL секунд, читает эту таблицу
+    и вызывает обработчики для изменившихся пространств имен.
+    """
+
+    def __init__(self, poll_interval=INVALIDATION_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+        self._versions = None
+        self._polled_at = 0.0
+        self.stats = {
+            'published': 0,
+            'polls': 0,
+            'received': 0,
+            'lag_seconds_sum': 0.0,
+            'lag_seconds_max': 0.0,
+            'lag_seconds_last': 0.0,
+        }
+
+    def subscribe(self, namespace, callback):
+        """Обработчик, который вызывается при сбросе пространства имен."""
+        self._subscribers[namespace].append(callback)
+
+    def _notify(self, namespace):
+        for callback in self._subscribers.get(namespace, ()):
+            callback()
+
+    def publish(self, namespace):
+        """
+        Сбрасываем кэш в текущем процессе сразу,
+        а в остальных - после фиксации транзакции.
+        """
+        self._notify(namespace)
+        transaction.on_commit(lambda: self._bump(namespace))
+
+    def _increment(self, namespace):
+        return CacheVersion.objects.filter(namespace=namespace).update(
+            version=F('version') + 1,
+            updated_at=timezone.now(),
+        )
+
+    def _bump(self, namespace):
+        if not self._increment(namespace):
+            try:
+                with transaction.atomic():
+                    CacheVersion.objects.create(
+                        namespace=namespace, version=1,
+                    )
+            except IntegrityError:
+                # Строку одновременно создал другой процесс:
+                # увеличиваем его версию, чтобы сброс не потерялся.
+                self._increment(namespace)
+        self.stats['published'] += 1
+
+    def poll(self, force=False):
+        """Сверяем версии с БД, если с прошлой сверки прошло достаточно."""
+        now = time.monotonic()
+        if not force and now - self._polled_at < self.poll_interval:
+            return
+        with self._lock:
+            if not force and now - self._polled_at < self.poll_interval:
+                return
+            self._polled_at = now
+            try:
+                # Версии читаем из основной БД: реплика может отставать.
+                rows = list(CacheVersion.objects.using(
+                    DEFAULT_DB_ALIAS
+                ).values_list('namespace', 'version', 'updated_at'))
+            except DatabaseError:
+                return
+            self.stats['polls'] += 1
+            known, self._versions = self._versions, {
+                namespace: version for namespace, version, _ in rows
+            }
+        if known is None:
+            # Первая сверка: кэши процесса еще пусты, сбрасывать нечего.
+            return
+        received_at = timezone.now()
+        for namespace, version, updated_at in rows:
+            if known.get(namespace) == version:
+                continue
+            self._notify(namespace)
+            lag = max((received_at - updated_at).total_seconds(), 0.0)
+            self.stats['received'] += 1
+            self.stats['lag_seconds_sum'] += lag
+            self.stats['lag_seconds_last'] = lag
+            self.stats['lag_seconds_max'] = max(
+                self.stats['lag_seconds_max'], lag
+            )
+
+
+bus = InvalidationBus()
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from app import feed
+from foodgram_backend.settings import FEED_TRIM_INTERVAL, FEED_WORKER_INTERVAL
+
+
+class Command(BaseCommand):
+    """
+    Обработчик ленты подписок: рассылает новые рецепты по лентам
+    подписчиков и периодически обрезает ленты.
+        python manage.py feed_worker
+    После generate_data ленты собираются заново:
+        python manage.py feed_worker --rebuild --once
+    """
+    help = 'Fanning out new recipes to follower feeds'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--once', action='store_true',
+            help='process pending recipes and exit',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='rebuild all feeds from current follows first',
+        )
+        parser.add_argument('--batch', type=int, default=10)
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            feed.rebuild()
+            self.stdout.write('feeds rebuilt')
+        trimmed_at = time.monotonic()
+        while True:
+            processed = feed.process_events(options['batch'])
+            if processed:
+                self.stdout.write(f'fanned out {processed} recipes')
+            if time.monotonic() - trimmed_at >= FEED_TRIM_INTERVAL:
+                trimmed_at = time.monotonic()
+                self.stdout.write(f'trimmed {feed.trim()} feed entries')
+            if options['once'] and not processed:
+                return
+            if not processed:
+                time.sleep(FEED_WORKER_INTERVAL)
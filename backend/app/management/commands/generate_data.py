@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from app.generator import DataGenerator
+
+
+class Command(BaseCommand):
+    """
+    Генерация синтетических данных для нагрузочного тестирования.
+    Пример: python manage.py generate_data --users 100000 --recipes 1000000
+    """
+    help = 'Generating synthetic users, recipes, follows, favorites and carts'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='seed for a reproducible dataset',
+        )
+        parser.add_argument(
+            '--follows', type=float, default=20,
+            help='average follows per user',
+        )
+        parser.add_argument(
+            '--favorites', type=float, default=15,
+            help='average favorites per user',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='average shopping cart recipes per user',
+        )
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        DataGenerator(
+            users=options['users'],
+            recipes=options['recipes'],
+            seed=options['seed'],
+            follows=options['follows'],
+            favorites=options['favorites'],
+            carts=options['carts'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        ).generate()
+        self.stdout.write(self.style.SUCCESS(
+            f'done in {time.monotonic() - start:.1f}s'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from app import counters
+
+
+class Command(BaseCommand):
+    """
+    Сверка денормализованных счетчиков с настоящими данными.
+    Запускается по расписанию, например раз в сутки:
+        python manage.py reconcile_counters
+    """
+    help = 'Reconciling denormalized popularity counters'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='only report drifted rows',
+        )
+
+    def handle(self, *args, **options):
+        fixed = counters.reconcile(dry_run=options['dry_run'])
+        verb = 'drifted' if options['dry_run'] else 'fixed'
+        for counter, rows in fixed.items():
+            self.stdout.write(f'{counter}: {rows} {verb}')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from app import similar
+from foodgram_backend.settings import SIMILAR_RECIPES_INTERVAL
+
+
+class Command(BaseCommand):
+    """
+    Пересчет похожих рецептов (app/similar.py): раз в
+    SIMILAR_RECIPES_INTERVAL секунд пересчитывает рецепты,
+    измененные по журналу RecipeChange, а раз в
+    SIMILAR_RECIPES_REBUILD_INTERVAL секунд - все рецепты.
+        python manage.py similar_recipes
+    Полный пересчет сразу, например после generate_data:
+        python manage.py similar_recipes --rebuild --once
+    """
+    help = 'Precomputing similar recipes'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            '--once', action='store_true',
+            help='process changed recipes and exit',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='recompute all recipes first',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.monotonic()
+            recipes = similar.rebuild()
+            self.stdout.write(
+                f'rebuilt {recipes} recipes '
+                f'in {time.monotonic() - started:.1f} s'
+            )
+        while True:
+            recipes = similar.refresh()
+            if recipes:
+                self.stdout.write(f'refreshed {recipes} recipes')
+            if options['once']:
+                return
+            time.sleep(SIMILAR_RECIPES_INTERVAL)
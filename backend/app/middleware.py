@@ -0,0 +1,12 @@
+from app.invalidation import bus
+
+
+class InvalidationMiddleware:
+    """Перед обработкой запроса сверяем версии кэшей процесса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        bus.poll()
+        return self.get_response(request)
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-19 07:57
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('namespace', models.CharField(help_text='Пространство имен', max_length=100, unique=True, verbose_name='Пространство имен')),
+                ('version', models.PositiveBigIntegerField(default=0, help_text='Версия', verbose_name='Версия')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, help_text='Время изменения', verbose_name='Время изменения')),
+            ],
+        ),
+    ]
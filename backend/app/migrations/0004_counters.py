@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:23
+
+from django.db import migrations, models
+
+from app.counters import reconcile
+
+
+def fill_counters(apps, schema_editor):
+    reconcile(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_feed'),
+        ('users', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='В избранном у пользователей', verbose_name='В избранном у пользователей'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='В корзинах у пользователей', verbose_name='В корзинах у пользователей'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
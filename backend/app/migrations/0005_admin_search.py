@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['name'], name='recipe_name_prefix_idx', opclasses=('varchar_pattern_ops',)),
+        ),
+    ]
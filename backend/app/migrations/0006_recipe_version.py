@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_admin_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Меняется при изменении рецепта, тегов, ингредиентов или профиля автора', verbose_name='Версия'),
+        ),
+    ]
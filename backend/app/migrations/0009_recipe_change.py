@@ -0,0 +1,21 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.BigIntegerField(help_text='Рецепт', verbose_name='Рецепт')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, help_text='Время изменения', verbose_name='Время изменения')),
+            ],
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.3 on 2026-10-19 08:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_recipe_change'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipesBuild',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('change_id', models.BigIntegerField(help_text='Последняя запись журнала', verbose_name='Последняя запись журнала')),
+                ('full', models.BooleanField(default=False, help_text='Полный пересчет', verbose_name='Полный пересчет')),
+                ('recipes', models.PositiveIntegerField(default=0, help_text='Пересчитано рецептов', verbose_name='Пересчитано рецептов')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Время пересчета', verbose_name='Время пересчета')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeNeighbour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('neighbour_id', models.BigIntegerField(db_index=True, help_text='Похожий рецепт', verbose_name='Похожий рецепт')),
+                ('score', models.FloatField(help_text='Близость от 0 до 1', verbose_name='Близость')),
+                ('recipe', models.ForeignKey(db_index=False, help_text='Рецепт', on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='app.recipe', verbose_name='Рецепт')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipeneighbour',
+            index=models.Index(fields=['recipe', '-score'], name='neighbour_recipe_score_idx'),
+        ),
+    ]
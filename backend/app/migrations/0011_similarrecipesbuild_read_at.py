@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-19 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='similarrecipesbuild',
+            name='read_at',
+            field=models.DateTimeField(help_text='Время чтения журнала', null=True, verbose_name='Время чтения журнала'),
+        ),
+        migrations.AddField(
+            model_name='similarrecipesbuild',
+            name='rebuilt_at',
+            field=models.DateTimeField(help_text='Время последнего полного пересчета', null=True, verbose_name='Время последнего полного пересчета'),
+        ),
+    ]
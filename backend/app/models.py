@@ -1,6 +1,7 @@
 from django.db import models
 from colorfield.fields import ColorField
 from django.core import validators
+from django.utils import timezone
 
 from foodgram_backend.settings import MIN_AMOUNT, MIN_COOKING_TIME
 from users.models import User
@@ -20,6 +21,14 @@ class Ingredient(models.Model):
 
     class Meta:
         ordering = ('name',)
+        indexes = (
+            # Поиск по началу названия (?name=, LIKE 'abc%').
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.name} {self.measurement_unit}'
@@ -86,15 +95,62 @@ class Recipe(models.Model):
         help_text='Автор рецепта',
         on_delete=models.CASCADE,
         related_name='recipes',
+        # Покрыт индексом recipe_author_pub_date_idx.
+        db_index=False,
     )
     pub_date = models.DateField(
         verbose_name='Дата публикации',
         help_text='Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном у пользователей',
+        help_text='В избранном у пользователей',
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах у пользователей',
+        help_text='В корзинах у пользователей',
+    )
+    version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия',
+        help_text='Меняется при изменении рецепта, тегов, ингредиентов '
+                  'или профиля автора',
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date',),
+                name='recipe_pub_date_idx',
+            ),
+            # ?author= и последние рецепты авторов в подписках.
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=('-favorites_count', '-id'),
+                name='recipe_popular_idx',
+            ),
+            # ?cooking_time_max=: узкие диапазоны времени приготовления.
+            models.Index(
+                fields=('cooking_time',),
+                name='recipe_cooking_time_idx',
+            ),
+            # Поиск в админке по началу названия (LIKE 'abc%').
+            models.Index(
+                fields=('name',),
+                name='recipe_name_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.name} (время готовки:{self.cooking_time})'
@@ -105,11 +161,15 @@ class Composition(models.Model):
         Recipe,
         on_delete=models.CASCADE,
         related_name='composition',
+        # Покрыт индексом уникальности (recipe, ingredient).
+        db_index=False,
     )
     ingredient = models.ForeignKey(
         Ingredient,
         on_delete=models.CASCADE,
         related_name='composition',
+        # Покрыт индексом composition_ingr_recipe_idx.
+        db_index=False,
     )
     amount = models.PositiveSmallIntegerField(
         verbose_name='Количество',
@@ -124,6 +184,13 @@ class Composition(models.Model):
                 name='unique_recipe_ingredient',
             ),
         )
+        indexes = (
+            # ?ingredients= и ?exclude_ingredients=: рецепты ингредиента.
+            models.Index(
+                fields=('ingredient', 'recipe'),
+                name='composition_ingr_recipe_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe} {self.ingredient} {self.amount}'
@@ -133,20 +200,30 @@ class TagList(models.Model):
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
+        db_index=False,
     )
     tag = models.ForeignKey(
         Tag,
         on_delete=models.CASCADE,
         related_name='taglist',
+        db_index=False,
     )
 
     class Meta:
+        # Внешние ключи покрыты составными индексами в обе стороны.
         constraints = (
             models.UniqueConstraint(
                 fields=('recipe', 'tag',),
                 name='unique_recipe_tag',
             ),
         )
+        indexes = (
+            # ?tags=: рецепты тега.
+            models.Index(
+                fields=('tag', 'recipe'),
+                name='taglist_tag_recipe_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.recipe} {self.tag}'
@@ -158,20 +235,30 @@ class ShoppingCart(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='shop_list',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='is_in_shopping_cart',
+        db_index=False,
     )
 
     class Meta:
+        # Внешние ключи покрыты составными индексами в обе стороны.
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe',),
                 name='unique_user_recipe_in_shopping_cart',
             ),
         )
+        indexes = (
+            # Пересчет счетчиков и удаление рецепта.
+            models.Index(
+                fields=('recipe', 'user'),
+                name='shoppingcart_recipe_user_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'{self.user} хочет купить {self.recipe}.'
@@ -183,20 +270,249 @@ class Favorite(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='favorites',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         related_name='is_favorited',
+        db_index=False,
     )
 
     class Meta:
+        # Внешние ключи покрыты составными индексами в обе стороны.
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'recipe',),
                 name='unique_user_recipe_favorite',
             ),
         )
+        indexes = (
+            # Пересчет счетчиков и удаление рецепта.
+            models.Index(
+                fields=('recipe', 'user'),
+                name='favorite_recipe_user_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return f'Пользователю {self.user} нравится {self.recipe}.'
+
+
+class CacheVersion(models.Model):
+    """
+    Версии кэшей в памяти процессов.
+    Каждый процесс периодически сверяется с этой таблицей
+    и сбрасывает кэши, версия которых изменилась.
+    """
+    namespace = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Пространство имен',
+        help_text='Пространство имен',
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия',
+        help_text='Версия',
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Время изменения',
+        help_text='Время изменения',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.namespace} v{self.version}'
+
+
+class FeedEntry(models.Model):
+    """
+    Строка ленты подписок: рецепт автора, на которого подписан
+    пользователь. Лента читается обратным проходом по индексу
+    уникальности (user, recipe).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Читатель',
+        help_text='Читатель',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+        help_text='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+        help_text='Автор рецепта',
+    )
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'recipe',),
+                name='unique_feed_user_recipe',
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_user_author_idx',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class FeedEvent(models.Model):
+    """
+    Новый рецепт, который еще не разослан по лентам подписчиков.
+    Создается в одной транзакции с рецептом, обрабатывается
+    командой feed_worker.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт',
+        help_text='Рецепт',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время создания',
+        help_text='Время создания',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} ({self.created_at})'
+
+
+class RecipeChange(models.Model):
+    """
+    Журнал изменений состава рецептов (ингредиенты, теги, удаление).
+    По нему индексы в памяти процессов догружают только изменившиеся
+    рецепты. Ссылки на рецепт нет: удаленный рецепт тоже попадает
+    в журнал.
+    """
+    recipe_id = models.BigIntegerField(
+        verbose_name='Рецепт',
+        help_text='Рецепт',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Время изменения',
+        help_text='Время изменения',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} ({self.created_at})'
+
+
+class RecipeNeighbour(models.Model):
+    """
+    Похожий рецепт: близость по ингредиентам и тегам, посчитанная
+    заранее командой similar_recipes (app/similar.py). Ссылки
+    на похожий рецепт нет: строки с удаленным рецептом убираются
+    при следующем пересчете.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name='Рецепт',
+        help_text='Рецепт',
+        # Покрыт индексом neighbour_recipe_score_idx.
+        db_index=False,
+    )
+    neighbour_id = models.BigIntegerField(
+        db_index=True,
+        verbose_name='Похожий рецепт',
+        help_text='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Близость',
+        help_text='Близость от 0 до 1',
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('recipe', '-score'),
+                name='neighbour_recipe_score_idx',
+            ),
+        )
+
+    def __str__(self) -> str:
+        return f'{self.recipe_id} ~ {self.neighbour_id} ({self.score:.3f})'
+
+
+class SimilarRecipesBuild(models.Model):
+    """
+    Последний пересчет похожих рецептов: до какой записи журнала
+    RecipeChange и когда учтены изменения (app/watermark.py).
+    Следующий пересчет начинается с нее.
+    """
+    change_id = models.BigIntegerField(
+        verbose_name='Последняя запись журнала',
+        help_text='Последняя запись журнала',
+    )
+    read_at = models.DateTimeField(
+        null=True,
+        verbose_name='Время чтения журнала',
+        help_text='Время чтения журнала',
+    )
+    rebuilt_at = models.DateTimeField(
+        null=True,
+        verbose_name='Время последнего полного пересчета',
+        help_text='Время последнего полного пересчета',
+    )
+    full = models.BooleanField(
+        default=False,
+        verbose_name='Полный пересчет',
+        help_text='Полный пересчет',
+    )
+    recipes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Пересчитано рецептов',
+        help_text='Пересчитано рецептов',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время пересчета',
+        help_text='Время пересчета',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.change_id} ({self.created_at})'
+
+
+class CelebrityAuthor(models.Model):
+    """
+    Автор со слишком большим числом подписчиков для рассылки по лентам:
+    его рецепты подмешиваются в ленту при чтении.
+    """
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='celebrity',
+        verbose_name='Автор',
+        help_text='Автор',
+    )
+    since = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='С какого времени',
+        help_text='С какого времени',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.author_id}'
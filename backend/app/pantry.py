@@ -0,0 +1,211 @@
+"""
+Поиск рецептов по имеющимся продуктам ("что приготовить").
+Инвертированный индекс в памяти процесса: для каждого ингредиента -
+массив NumPy с номерами (слотами) рецептов, в которых он есть.
+Покрытие считается векторно: для каждого ингредиента из запроса
+к счетчикам его рецептов прибавляется единица, и рецепты ранжируются
+по числу недостающих ингредиентов.
+Вместо плотных битовых масок (n/8 байт на ингредиент, 250 МБ для
+2000 ингредиентов и миллиона рецептов) хранятся списки слотов:
+4 байта на строку Composition.
+"""
+import itertools
+import logging
+import threading
+import time
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from app import changes
+from app.invalidation import bus
+from app.models import Composition
+from foodgram_backend.settings import PANTRY_RELOAD_INTERVAL
+
+SLOT = np.int32
+# Строк Composition за одно чтение из курсора.
+LOAD_CHUNK_SIZE = 10000
+
+logger = logging.getLogger('foodgram.pantry')
+
+
+def load_pairs(queryset, fields=('recipe_id', 'ingredient_id')):
+    """Пары (рецепт, ингредиент) или другие два поля как массив n x 2."""
+    rows = queryset.values_list(*fields).iterator(chunk_size=LOAD_CHUNK_SIZE)
+    return np.fromiter(
+        itertools.chain.from_iterable(rows), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+class Snapshot:
+    """
+    Неизменяемое состояние индекса: обновление создает новый снимок,
+    поэтому поиск читает согласованные данные без блокировок.
+    recipe_ids, sizes (число ингредиентов) и alive - по слотам;
+    postings - {ингредиент: слоты}. Измененный рецепт получает новый
+    слот, а старый помечается мертвым до полной перезагрузки.
+    """
+
+    def __init__(self, recipe_ids, sizes, alive, postings):
+        self.recipe_ids = recipe_ids
+        self.sizes = sizes
+        self.alive = alive
+        self.postings = postings
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            np.empty(0, np.int64), np.empty(0, np.int16),
+            np.empty(0, bool), {},
+        )
+
+    def extend(self, changed_ids, pairs):
+        """Новый снимок: рецепты changed_ids заменены строками pairs."""
+        alive = self.alive.copy()
+        alive[np.isin(self.recipe_ids, list(changed_ids))] = False
+        recipe_ids, slots = np.unique(pairs[:, 0], return_inverse=True)
+        slots = slots.astype(SLOT) + len(self.recipe_ids)
+        postings = dict(self.postings)
+        ingredients = pairs[:, 1]
+        order = np.argsort(ingredients, kind='stable')
+        ingredients, slots = ingredients[order], slots[order]
+        unique, starts = np.unique(ingredients, return_index=True)
+        for ingredient_id, ingredient_slots in zip(
+            unique.tolist(), np.split(slots, starts[1:])
+        ):
+            previous = postings.get(ingredient_id)
+            if previous is not None:
+                ingredient_slots = np.concatenate((previous, ingredient_slots))
+            postings[ingredient_id] = ingredient_slots
+        return Snapshot(
+            np.concatenate((self.recipe_ids, recipe_ids)),
+            np.concatenate((
+                self.sizes,
+                np.bincount(slots - len(self.recipe_ids)).astype(np.int16),
+            )),
+            np.concatenate((alive, np.ones(len(recipe_ids), bool))),
+            postings,
+        )
+
+    def search(self, ingredient_ids, limit):
+        """
+        Лучшие limit рецептов: (id, есть ингредиентов, не хватает).
+        Меньше недостающих - выше, затем больше совпавших,
+        затем добавленные в индекс позже.
+        """
+        counts = np.zeros(len(self.recipe_ids), np.int16)
+        for ingredient_id in set(ingredient_ids):
+            slots = self.postings.get(ingredient_id)
+            if slots is not None:
+                # В одном списке слоты не повторяются.
+                counts[slots] += 1
+        candidates = np.flatnonzero((counts > 0) & self.alive)
+        matched = counts[candidates].astype(np.int64)
+        missing = self.sizes[candidates].astype(np.int64) - matched
+        # Ключ сортировки одним числом: недостающие, затем совпавшие
+        # по убыванию, затем слот по убыванию.
+        keys = (missing << 47) | ((0x7FFF - matched) << 32) | (
+            0x7FFFFFFF - candidates
+        )
+        if len(keys) > limit:
+            top = np.argpartition(keys, limit)[:limit]
+        else:
+            top = np.arange(len(keys))
+        top = top[np.argsort(keys[top])]
+        return list(zip(
+            self.recipe_ids[candidates[top]].tolist(),
+            matched[top].tolist(),
+            missing[top].tolist(),
+        ))
+
+
+class PantryIndex:
+    """
+    Индекс ингредиент -> рецепты в памяти процесса.
+    Загружается при первом поиске. Изменения рецептов догружаются
+    по журналу RecipeChange (app/changes.py) после сигнала шины,
+    а раз в PANTRY_RELOAD_INTERVAL секунд индекс строится заново
+    в фоновом потоке, чтобы выбросить мертвые слоты. Пока он строится,
+    поиск идет по старому снимку; блокировка нужна только для подмены.
+    """
+
+    def __init__(self, reload_interval=PANTRY_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        # Одна полная загрузка за раз.
+        self._load_lock = threading.Lock()
+        self._snapshot = None
+        self._watermark = None
+        self._loaded_at = None
+        self._stale = True
+        self._reloading = False
+        bus.subscribe(changes.NAMESPACE, self.mark_stale)
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _load(self):
+        """Полная загрузка: новый снимок подменяет старый целиком."""
+        watermark = changes.watermark()
+        snapshot = Snapshot.empty().extend((), load_pairs(
+            Composition.objects.using(DEFAULT_DB_ALIAS)
+        ))
+        with self._lock:
+            self._snapshot = snapshot
+            self._watermark = watermark
+            self._loaded_at = time.monotonic()
+
+    def _load_first(self):
+        with self._load_lock:
+            if self._snapshot is None:
+                # Изменения, сделанные во время загрузки, снова
+                # пометят индекс устаревшим, и их догрузит следующий поиск.
+                self._stale = False
+                self._load()
+
+    def _reload(self):
+        try:
+            with self._load_lock:
+                self._load()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс продуктов')
+        finally:
+            self._reloading = False
+            connections.close_all()
+
+    def _start_reload(self):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(
+            target=self._reload, name='pantry-reload', daemon=True,
+        ).start()
+
+    def _refresh(self):
+        with self._lock:
+            if not self._stale:
+                # Другой поток уже догрузил изменения.
+                return
+            self._stale = False
+            changed_ids = changes.since(self._watermark)
+            if changed_ids:
+                self._snapshot = self._snapshot.extend(changed_ids, load_pairs(
+                    Composition.objects.using(DEFAULT_DB_ALIAS).filter(
+                        recipe_id__in=changed_ids
+                    )
+                ))
+
+    def search(self, ingredient_ids, limit):
+        """См. Snapshot.search."""
+        bus.poll()
+        if self._snapshot is None:
+            self._load_first()
+        elif time.monotonic() - self._loaded_at >= self.reload_interval:
+            self._start_reload()
+        if self._stale:
+            self._refresh()
+        return self._snapshot.search(ingredient_ids, limit)
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from app import changes, fragments
+from app.cache import ingredient_cache, tag_cache
+from app.models import Composition, FeedEvent, Ingredient, Recipe, Tag
+from users.models import User
+
+# Поля автора, которые входят во фрагменты его рецептов.
+AUTHOR_FRAGMENT_FIELDS = {'username', 'email', 'first_name', 'last_name'}
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_cache(sender, **kwargs):
+    """Сбрасываем кэш тегов при изменении."""
+    tag_cache.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_cache(sender, **kwargs):
+    """Сбрасываем кэш ингредиентов при изменении."""
+    ingredient_cache.invalidate()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def record_ingredient_recipes(sender, instance, **kwargs):
+    """
+    Ингредиент удаляется из рецептов каскадом, без сериализаторов
+    и админки рецептов: отмечаем изменение рецептов здесь.
+    """
+    recipe_ids = list(Composition.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+    if recipe_ids:
+        fragments.bump(recipe_ids)
+        changes.record(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def enqueue_feed_event(sender, instance, created, raw=False, **kwargs):
+    """Новый рецепт ставим в очередь на рассылку по лентам подписчиков."""
+    if created and not raw:
+        FeedEvent.objects.create(recipe=instance)
+
+
+@receiver(post_save, sender=User)
+def bump_author_recipes(sender, instance, created, update_fields=None,
+                        raw=False, **kwargs):
+    """Профиль автора входит во фрагменты его рецептов."""
+    if created or raw:
+        return
+    if update_fields is not None and not (
+        AUTHOR_FRAGMENT_FIELDS & set(update_fields)
+    ):
+        # Например, обновление last_login при входе в админку.
+        return
+    fragments.bump(author_id=instance.pk)
@@ -0,0 +1,223 @@
+"""
+Похожие рецепты: близость по составу (коэффициент Жаккара
+по ингредиентам) и тегам, посчитанная заранее и сохраненная
+в RecipeNeighbour. Считает команда similar_recipes.
+Рецепты - разреженные векторы ингредиентов: матрица рецепт x ингредиент
+в формате CSR из массивов NumPy по строкам и по столбцам. Кандидаты
+в похожие - рецепты из списков ингредиентов рецепта, поэтому
+пересечения считаются только с ними, а не со всеми рецептами.
+Ингредиенты из слишком длинных списков (соль) кандидатов не дают,
+но для найденных кандидатов учитываются бинарным поиском.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from app import changes
+from app.models import (
+    Composition, Recipe, RecipeNeighbour, SimilarRecipesBuild, TagList,
+)
+from app.pantry import load_pairs
+from foodgram_backend.settings import (
+    SIMILAR_RECIPES_COUNT, SIMILAR_RECIPES_MAX_POSTING,
+    SIMILAR_RECIPES_REBUILD_INTERVAL, SIMILAR_RECIPES_TAG_WEIGHT,
+)
+
+# Рецептов за одну транзакцию записи.
+STORE_BATCH_SIZE = 1000
+
+
+def _csr(rows, columns, size):
+    """Матрица из пар (строка, столбец): indptr и столбцы по строкам."""
+    indptr = np.zeros(size + 1, np.int64)
+    np.cumsum(np.bincount(rows, minlength=size), out=indptr[1:])
+    return indptr, columns[np.lexsort((columns, rows))]
+
+
+class Vectors:
+    """
+    Ингредиенты и теги всех рецептов с ингредиентами. Рецепт - номер
+    (слот) в recipe_ids; ingredients - ингредиенты по слотам,
+    postings - слоты по ингредиентам (по возрастанию),
+    tags - плотная матрица рецепт x тег: тегов немного.
+    """
+
+    def __init__(self, pairs, tag_pairs):
+        self.recipe_ids = np.unique(pairs[:, 0])
+        count = len(self.recipe_ids)
+        slots = np.searchsorted(self.recipe_ids, pairs[:, 0])
+        ingredient_ids, codes = np.unique(pairs[:, 1], return_inverse=True)
+        self.indptr, self.ingredients = _csr(slots, codes, count)
+        self.posting_indptr, self.postings = _csr(
+            codes, slots, len(ingredient_ids)
+        )
+        self.sizes = np.diff(self.indptr)
+        tag_pairs = tag_pairs[np.isin(tag_pairs[:, 0], self.recipe_ids)]
+        tag_ids, tag_codes = np.unique(tag_pairs[:, 1], return_inverse=True)
+        self.tags = np.zeros((count, len(tag_ids)), bool)
+        self.tags[
+            np.searchsorted(self.recipe_ids, tag_pairs[:, 0]), tag_codes
+        ] = True
+        self.tag_sizes = self.tags.sum(axis=1)
+
+    @classmethod
+    def load(cls):
+        return cls(
+            load_pairs(Composition.objects.using(DEFAULT_DB_ALIAS)),
+            load_pairs(
+                TagList.objects.using(DEFAULT_DB_ALIAS),
+                ('recipe_id', 'tag_id'),
+            ),
+        )
+
+    def slots(self, recipe_ids):
+        """Слоты рецептов recipe_ids, которые есть в векторах."""
+        recipe_ids = np.fromiter(recipe_ids, np.int64)
+        slots = np.searchsorted(self.recipe_ids, recipe_ids)
+        found = slots < len(self.recipe_ids)
+        found[found] = self.recipe_ids[slots[found]] == recipe_ids[found]
+        return slots[found]
+
+    def neighbours(self, slot, count=SIMILAR_RECIPES_COUNT):
+        """
+        Слоты и близость count самых похожих на рецепт slot.
+        Близость - взвешенная сумма коэффициентов Жаккара ингредиентов
+        и тегов, при равенстве выше рецепты с большим id. Рецепты
+        без общих ингредиентов похожими не считаются.
+        """
+        codes = self.ingredients[self.indptr[slot]:self.indptr[slot + 1]]
+        starts = self.posting_indptr[codes]
+        ends = self.posting_indptr[codes + 1]
+        rare = ends - starts <= SIMILAR_RECIPES_MAX_POSTING
+        if not rare.any():
+            rare[np.argmin(ends - starts)] = True
+        candidates, shared = np.unique(np.concatenate([
+            self.postings[start:end]
+            for start, end in zip(starts[rare], ends[rare])
+        ]), return_counts=True)
+        for start, end in zip(starts[~rare], ends[~rare]):
+            posting = self.postings[start:end]
+            positions = np.searchsorted(posting, candidates).clip(
+                max=len(posting) - 1
+            )
+            shared += posting[positions] == candidates
+        other = candidates != slot
+        candidates, shared = candidates[other], shared[other]
+        score = shared / (self.sizes[slot] + self.sizes[candidates] - shared)
+        shared_tags = self.tags[candidates][:, self.tags[slot]].sum(axis=1)
+        tag_union = (
+            self.tag_sizes[slot] + self.tag_sizes[candidates] - shared_tags
+        )
+        tag_score = np.divide(
+            shared_tags, tag_union,
+            out=np.zeros(len(candidates)), where=tag_union > 0,
+        )
+        score = (
+            (1 - SIMILAR_RECIPES_TAG_WEIGHT) * score
+            + SIMILAR_RECIPES_TAG_WEIGHT * tag_score
+        )
+        if len(score) > count:
+            # Сортируем только лучшие, вместе с равными последнему.
+            best = score >= np.partition(score, -count)[-count]
+            candidates, score = candidates[best], score[best]
+        top = np.lexsort((-self.recipe_ids[candidates], -score))[:count]
+        return candidates[top], score[top]
+
+
+def store(vectors, slots):
+    """Пересчитываем и сохраняем похожие рецепты для слотов slots."""
+    slots = list(slots)
+    for start in range(0, len(slots), STORE_BATCH_SIZE):
+        batch = slots[start:start + STORE_BATCH_SIZE]
+        rows = {}
+        for slot in batch:
+            neighbours, scores = vectors.neighbours(slot)
+            rows[int(vectors.recipe_ids[slot])] = zip(
+                vectors.recipe_ids[neighbours].tolist(), scores.tolist()
+            )
+        with transaction.atomic():
+            RecipeNeighbour.objects.filter(recipe_id__in=rows).delete()
+            # Рецепт могли удалить после загрузки векторов.
+            existing = Recipe.objects.filter(
+                pk__in=rows
+            ).values_list('pk', flat=True)
+            RecipeNeighbour.objects.bulk_create(
+                RecipeNeighbour(
+                    recipe_id=recipe_id, neighbour_id=neighbour_id,
+                    score=score,
+                )
+                for recipe_id in existing
+                for neighbour_id, score in rows[recipe_id]
+            )
+
+
+def _finish(watermark, full, recipes, rebuilt_at=None):
+    """Запоминаем, до какой записи журнала и когда учтены изменения."""
+    build = SimilarRecipesBuild.objects.create(
+        change_id=watermark.last_id, read_at=watermark.read_at,
+        full=full, recipes=recipes,
+        rebuilt_at=watermark.read_at if full else rebuilt_at,
+    )
+    SimilarRecipesBuild.objects.filter(id__lt=build.id).delete()
+
+
+def rebuild():
+    """Полный пересчет. Возвращает число рецептов."""
+    # Метку журнала берем до данных: изменения, сделанные
+    # во время пересчета, учтутся еще раз следующим обновлением.
+    watermark = changes.watermark()
+    vectors = Vectors.load()
+    store(vectors, range(len(vectors.recipe_ids)))
+    RecipeNeighbour.objects.filter(~Exists(
+        Composition.objects.filter(recipe_id=OuterRef('recipe_id'))
+    )).delete()
+    _finish(watermark, True, len(vectors.recipe_ids))
+    return len(vectors.recipe_ids)
+
+
+def refresh():
+    """
+    Пересчет рецептов, измененных после прошлого пересчета, рецептов,
+    у которых они были похожими, и их новых похожих (близость
+    симметрична). Рецепт, который стал похожим на другой, но не попал
+    в число похожих на него самого, появится после полного пересчета,
+    поэтому раз в SIMILAR_RECIPES_REBUILD_INTERVAL секунд пересчет полный.
+    Полный пересчет и без прошлого пересчета или если журнал уже удалил
+    непрочитанные записи. Векторы загружаются целиком, пошаговый только
+    расчет. Возвращает число рецептов.
+    """
+    build = SimilarRecipesBuild.objects.order_by('-id').first()
+    if (
+        build is None
+        or build.rebuilt_at is None
+        or build.rebuilt_at < timezone.now() - timedelta(
+            seconds=SIMILAR_RECIPES_REBUILD_INTERVAL
+        )
+        or changes.first_id() > build.change_id + 1
+    ):
+        return rebuild()
+    watermark = changes.watermark(build.change_id, build.read_at)
+    changed_ids = changes.since(watermark)
+    if not changed_ids:
+        # Время чтения двигаем и без изменений: иначе окно перекрытия
+        # растет с каждой проверкой.
+        _finish(watermark, False, 0, build.rebuilt_at)
+        return 0
+    vectors = Vectors.load()
+    changed = vectors.slots(changed_ids)
+    affected = set(changed.tolist())
+    affected.update(vectors.slots(RecipeNeighbour.objects.filter(
+        neighbour_id__in=changed_ids
+    ).values_list('recipe_id', flat=True)).tolist())
+    for slot in changed:
+        affected.update(vectors.neighbours(slot)[0].tolist())
+    # Рецепты, у которых не осталось ингредиентов.
+    RecipeNeighbour.objects.filter(recipe_id__in=set(changed_ids) - set(
+        vectors.recipe_ids[changed].tolist()
+    )).delete()
+    store(vectors, sorted(affected))
+    _finish(watermark, False, len(affected), build.rebuilt_at)
+    return len(affected)
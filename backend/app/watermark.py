@@ -0,0 +1,58 @@
+"""
+Чтение новых строк журнала (таблицы, которая только дополняется) по id.
+Id выдается при вставке, а строка видна только после фиксации
+транзакции, поэтому строка с меньшим id может стать видна позже
+строки с большим. Кроме строк с id больше прочитанного, перечитываем
+строки, созданные не раньше чем за LOG_READ_OVERLAP секунд
+до прошлого чтения, и отбрасываем уже прочитанные из них.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from foodgram_backend.settings import LOG_READ_OVERLAP
+
+
+class Watermark:
+    """
+    Докуда прочитан журнал: последний id, время прошлого чтения
+    и прочитанные строки из окна перекрытия {id: время создания}.
+    time_field - поле времени создания строки.
+    """
+
+    def __init__(self, time_field, last_id=0, read_at=None,
+                 overlap=LOG_READ_OVERLAP):
+        self.time_field = time_field
+        self.last_id = last_id
+        self.read_at = read_at
+        self.overlap = timedelta(seconds=overlap)
+        self._recent = {}
+
+    def read(self, queryset, *fields):
+        """Непрочитанные строки queryset: кортежи (id, *fields)."""
+        now = timezone.now()
+        new_rows = Q(id__gt=self.last_id)
+        if self.read_at is not None:
+            new_rows |= Q(**{
+                f'{self.time_field}__gte': self.read_at - self.overlap
+            })
+        rows = queryset.filter(new_rows).values_list(
+            'id', self.time_field, *fields
+        )
+        cutoff = now - self.overlap
+        recent = {
+            pk: created for pk, created in self._recent.items()
+            if created >= cutoff
+        }
+        result = []
+        for pk, created, *values in rows:
+            if pk in self._recent:
+                continue
+            result.append((pk, *values))
+            self.last_id = max(self.last_id, pk)
+            if created >= cutoff:
+                recent[pk] = created
+        self._recent = recent
+        self.read_at = now
+        return result
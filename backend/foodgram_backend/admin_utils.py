@@ -0,0 +1,90 @@
+"""Общие настройки админки для больших таблиц."""
+import json
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from foodgram_backend.settings import ADMIN_EXACT_COUNT_LIMIT
+
+
+def estimated_count(queryset):
+    """
+    Оценка числа строк из плана PostgreSQL (EXPLAIN) без COUNT(*).
+    None, если оценка недоступна.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    # QuerySet.explain(format='json') в Django 3.2 возвращает repr
+    # вместо JSON, поэтому выполняем EXPLAIN сами.
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для больших выборок показывает оценку
+    числа строк вместо точного COUNT(*) по всей таблице.
+    Точно считаются выборки до ADMIN_EXACT_COUNT_LIMIT строк.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is not None and estimate > ADMIN_EXACT_COUNT_LIMIT:
+            return estimate
+        return super().count
+
+
+class ScaledModelAdmin(admin.ModelAdmin):
+    """
+    Админка для таблиц с миллионами строк: без точного подсчета
+    и с поиском только по индексам (без LIKE '%...%' и JOIN).
+    Строка поиска из цифр ищется среди id (search_id_fields),
+    любая - по началу строки (search_prefix_fields), точному значению
+    (search_exact_fields) и точному имени или почте пользователя
+    (search_user_fields, внешние ключи на пользователя).
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_id_fields = ()
+    search_prefix_fields = ()
+    search_exact_fields = ()
+    search_user_fields = ()
+
+    @property
+    def search_fields(self):
+        # Непустой список нужен для строки поиска и autocomplete_fields.
+        return (*self.search_id_fields, *self.search_prefix_fields,
+                *self.search_exact_fields, *self.search_user_fields)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        query = Q()
+        if term.isdigit():
+            for field in self.search_id_fields:
+                query |= Q(**{field: int(term)})
+        for field in self.search_prefix_fields:
+            query |= Q(**{f'{field}__startswith': term})
+        for field in self.search_exact_fields:
+            query |= Q(**{field: term})
+        if self.search_user_fields:
+            users = get_user_model().objects.filter(
+                Q(username=term) | Q(email=term)
+            ).values('pk')
+            for field in self.search_user_fields:
+                query |= Q(**{f'{field}__in': users})
+        if not query:
+            return queryset.none(), False
+        return queryset.filter(query), False
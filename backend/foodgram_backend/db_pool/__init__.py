@@ -0,0 +1,5 @@
+"""
+Бэкенд PostgreSQL с пулом подключений в процессе.
+Подключается через ENGINE = 'foodgram_backend.db_pool',
+параметры пула задаются ключом POOL в настройках БД.
+"""
@@ -0,0 +1,112 @@
+import threading
+from functools import partial
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from foodgram_backend.db_pool.pool import ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _ping(connection):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    # Без autocommit проверка открыла транзакцию, закрываем ее.
+    if connection.get_transaction_status() != (
+        extensions.TRANSACTION_STATUS_IDLE
+    ):
+        connection.rollback()
+
+
+def _reset(connection):
+    """Откатываем незавершенную транзакцию перед возвратом в пул."""
+    status = connection.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        raise Database.InterfaceError('connection is broken')
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+
+
+def get_pool(alias, settings_dict):
+    """Пул процесса для БД (alias и имя БД: у тестовой БД свой пул)."""
+    key = (alias, settings_dict['NAME'])
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                options = settings_dict.get('POOL', {})
+                pool = _pools[key] = ConnectionPool(
+                    size=options.get('SIZE', 10),
+                    max_lifetime=options.get('MAX_LIFETIME', 1800),
+                    timeout=options.get('TIMEOUT', 10),
+                    check=_ping if options.get('CHECK', True) else None,
+                    reset=_reset,
+                )
+    return pool
+
+
+def pools():
+    """Пулы процесса: {(alias, имя БД): пул}."""
+    return dict(_pools)
+
+
+def close_pools(name=None):
+    """Закрываем свободные подключения всех пулов или пулов БД name."""
+    for (_, pool_name), pool in pools().items():
+        if name is None or pool_name == name:
+            pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные подключения пула не дали бы удалить тестовую БД.
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL, где закрытие подключения возвращает его в пул процесса,
+    а открытие берет готовое из пула. CONN_MAX_AGE оставляем 0:
+    подключение возвращается в пул в конце каждого запроса.
+    """
+    creation_class = DatabaseCreation
+
+    @property
+    def pooled(self):
+        return self.alias != NO_DB_ALIAS
+
+    def get_new_connection(self, conn_params):
+        connect = partial(super().get_new_connection, conn_params)
+        if not self.pooled:
+            return connect()
+        try:
+            connection = get_pool(self.alias, self.settings_dict).get(connect)
+        except PoolTimeout as error:
+            raise Database.OperationalError(str(error)) from error
+        # Уровень изоляции выставлен при открытии подключения,
+        # а у подключения из пула его нужно запомнить заново.
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level', connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        with self.wrap_database_errors:
+            if not self.pooled:
+                return self.connection.close()
+            pool = get_pool(self.alias, self.settings_dict)
+            if self.in_atomic_block:
+                # Django держит ссылку на подключение, закрытое внутри
+                # atomic, поэтому в пул его не возвращаем.
+                return pool.discard(self.connection)
+            return pool.put(self.connection)
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Не дождались свободного подключения."""
+
+
+class ConnectionPool:
+    """
+    Пул подключений к БД, общий для потоков процесса.
+    Подключение выдается, если оно живо (проверка check) и не старше
+    max_lifetime секунд. Если все size подключений заняты, ждем
+    освобождения не дольше timeout секунд.
+    После fork пул в дочернем процессе начинается с нуля: подключения
+    родителя не закрываем, чтобы не оборвать их у родителя.
+    """
+
+    def __init__(self, size=10, max_lifetime=1800, timeout=10, check=None,
+                 reset=None):
+        self.size = size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.check = check
+        self.reset = reset
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._born = {}
+        self._open = 0
+        self._pid = os.getpid()
+        self.waiting = 0
+        self.stats = {
+            'connects': 0, 'checkouts': 0, 'discarded': 0,
+            'timeouts': 0, 'wait_seconds': 0.0,
+        }
+
+    @property
+    def open(self):
+        return self._open
+
+    @property
+    def idle(self):
+        return len(self._idle)
+
+    def _after_fork(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._born.clear()
+            self._open = 0
+
+    def _take(self):
+        """Свободное подключение или None, если можно открыть новое."""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        with self._cond:
+            self._after_fork()
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(
+                        f'Нет свободного подключения за {self.timeout} с, '
+                        f'все {self.size} заняты'
+                    )
+                self.waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.stats['wait_seconds'] += time.monotonic() - started
+            if self._idle:
+                # Берем последнее возвращенное: оно точно недавно работало.
+                return self._idle.pop()
+            self._open += 1
+            return None
+
+    def _expired(self, connection):
+        born = self._born.get(id(connection), 0)
+        return time.monotonic() - born > self.max_lifetime
+
+    def _usable(self, connection):
+        if connection.closed or self._expired(connection):
+            return False
+        if self.check is None:
+            return True
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    def _discard(self, connection):
+        """Закрываем подключение и освобождаем его место в пуле."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._cond:
+            if self._born.pop(id(connection), None) is not None:
+                self._open -= 1
+            self.stats['discarded'] += 1
+            self._cond.notify()
+
+    def get(self, connect):
+        """
+        Выдаем подключение из пула или открываем новое вызовом connect().
+        PoolTimeout, если свободного места не дождались.
+        """
+        while True:
+            connection = self._take()
+            if connection is None:
+                break
+            if self._usable(connection):
+                self.stats['checkouts'] += 1
+                return connection
+            self._discard(connection)
+        try:
+            connection = connect()
+        except BaseException:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(connection)] = time.monotonic()
+            self.stats['connects'] += 1
+            self.stats['checkouts'] += 1
+        return connection
+
+    def put(self, connection):
+        """Возвращаем подключение; сломанное или старое закрываем."""
+        if self._pid != os.getpid() or id(connection) not in self._born:
+            # Подключение чужого процесса или уже выброшенное из пула.
+            return
+        if connection.closed or self._expired(connection):
+            self._discard(connection)
+            return
+        if self.reset is not None:
+            try:
+                self.reset(connection)
+            except Exception:
+                self._discard(connection)
+                return
+        with self._cond:
+            self._idle.append(connection)
+            self._cond.notify()
+
+    def discard(self, connection):
+        """Закрываем подключение, не возвращая его в пул."""
+        if id(connection) in self._born:
+            self._discard(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        """Закрываем все свободные подключения."""
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for connection in idle:
+            self._discard(connection)
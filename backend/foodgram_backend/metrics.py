@@ -0,0 +1,283 @@
+"""Метрики процесса в текстовом формате Prometheus."""
+import math
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.http import Http404, HttpResponse
+
+from foodgram_backend.settings import METRICS_ENABLED, METRICS_TOKEN
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return (str(value).replace('\\', r'\\')
+            .replace('\n', r'\n').replace('"', r'\"'))
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in pairs
+    ) + '}'
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """Базовый класс метрики с набором меток."""
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [
+            f'# HELP {self.name} {self.documentation}',
+            f'# TYPE {self.name} {self.type}',
+        ]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = defaultdict(float)
+
+    def inc(self, labels=(), value=1):
+        with self._lock:
+            self._values[labels] += value
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(
+                f'{self.name}{_format_labels(self.labelnames, labels)} '
+                f'{_format_value(value)}'
+            )
+        return lines
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._values = {}
+
+    def observe(self, labels, value):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [
+                    [0] * len(self.buckets), 0.0, 0
+                ]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+            state[2] += 1
+
+    def collect(self):
+        lines = self.header()
+        with self._lock:
+            items = [
+                (labels, list(counts), total, count)
+                for labels, (counts, total, count) in self._values.items()
+            ]
+        for labels, counts, total, count in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                label_str = _format_labels(
+                    self.labelnames, labels, (('le', _format_value(bound)),)
+                )
+                lines.append(f'{self.name}_bucket{label_str} {cumulative}')
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_str} {_format_value(total)}')
+            lines.append(f'{self.name}_count{label_str} {count}')
+        return lines
+
+
+class Registry:
+    """
+    Реестр метрик процесса.
+    Кроме собственных метрик можно зарегистрировать функции-сборщики,
+    которые возвращают тройки (имя, описание, значение) или четверки
+    с добавленным словарем меток. Метрики с именем на _total -
+    счетчики (counter), остальные - gauge.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        gauges = {}
+        for collector in self._collectors:
+            for name, documentation, value, *labels in collector():
+                documentation, samples = gauges.setdefault(
+                    name, (documentation, [])
+                )
+                samples.append((labels[0] if labels else {}, value))
+        for name, (documentation, samples) in gauges.items():
+            metric_type = (
+                'counter' if name.endswith('_total') else 'gauge'
+            )
+            lines.append(f'# HELP {name} {documentation}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for labels, value in samples:
+                label_str = _format_labels(labels.keys(), labels.values())
+                lines.append(f'{name}{label_str} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+requests_total = registry.register(Counter(
+    'foodgram_http_requests_total',
+    'Количество обработанных запросов.',
+    ('view', 'method', 'status'),
+))
+request_duration = registry.register(Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса.',
+    ('view',),
+    LATENCY_BUCKETS,
+))
+response_size = registry.register(Histogram(
+    'foodgram_http_response_size_bytes',
+    'Размер тела ответа.',
+    ('view',),
+    SIZE_BUCKETS,
+))
+db_queries = registry.register(Histogram(
+    'foodgram_db_queries_per_request',
+    'Количество SQL запросов на один HTTP запрос.',
+    ('view',),
+    QUERY_COUNT_BUCKETS,
+))
+db_duration_total = registry.register(Counter(
+    'foodgram_db_query_duration_seconds_total',
+    'Суммарное время выполнения SQL запросов.',
+    ('view',),
+))
+
+
+@registry.register_collector
+def invalidation_bus_metrics():
+    """Задержка распространения сброса кэшей между процессами."""
+    from app.invalidation import bus
+    stats = bus.stats
+    return (
+        ('foodgram_invalidation_published_total',
+         'Опубликовано сбросов кэшей.', stats['published']),
+        ('foodgram_invalidation_received_total',
+         'Получено сбросов кэшей от других процессов.', stats['received']),
+        ('foodgram_invalidation_lag_seconds_sum',
+         'Суммарная задержка получения сбросов.', stats['lag_seconds_sum']),
+        ('foodgram_invalidation_lag_seconds_max',
+         'Максимальная задержка получения сброса.',
+         stats['lag_seconds_max']),
+        ('foodgram_invalidation_lag_seconds_last',
+         'Задержка получения последнего сброса.',
+         stats['lag_seconds_last']),
+    )
+
+
+@registry.register_collector
+def replica_metrics():
+    """Чтение с реплик БД и переключения на другую реплику."""
+    from foodgram_backend.replicas import replica_pool
+    stats = replica_pool.stats
+    return (
+        ('foodgram_db_replica_reads_total',
+         'Запросов, читавших с реплики.', stats['reads']),
+        ('foodgram_db_replica_fallbacks_total',
+         'Запросов, читавших из основной БД из-за недоступности реплик.',
+         stats['fallbacks']),
+        ('foodgram_db_replica_failovers_total',
+         'Неудачных подключений к репликам.', stats['failovers']),
+        ('foodgram_db_replicas_down',
+         'Реплик, временно исключенных из выбора.',
+         len(replica_pool.down())),
+    )
+
+
+@registry.register_collector
+def db_pool_metrics():
+    """Состояние пулов подключений к БД (бэкенд foodgram_backend.db_pool)."""
+    from foodgram_backend.db_pool.base import pools
+    samples = []
+    for (alias, _), pool in pools().items():
+        labels = {'database': alias}
+        samples.extend((
+            ('foodgram_db_pool_size', 'Максимум подключений в пуле.',
+             pool.size, labels),
+            ('foodgram_db_pool_open', 'Открытых подключений.',
+             pool.open, labels),
+            ('foodgram_db_pool_idle', 'Свободных подключений.',
+             pool.idle, labels),
+            ('foodgram_db_pool_waiting',
+             'Потоков, ждущих свободное подключение.',
+             pool.waiting, labels),
+            ('foodgram_db_pool_connects_total', 'Открыто новых подключений.',
+             pool.stats['connects'], labels),
+            ('foodgram_db_pool_checkouts_total', 'Выдано подключений.',
+             pool.stats['checkouts'], labels),
+            ('foodgram_db_pool_discarded_total',
+             'Закрыто сломанных и устаревших подключений.',
+             pool.stats['discarded'], labels),
+            ('foodgram_db_pool_timeouts_total',
+             'Не дождались свободного подключения.',
+             pool.stats['timeouts'], labels),
+            ('foodgram_db_pool_wait_seconds_total',
+             'Суммарное ожидание подключения.',
+             pool.stats['wait_seconds'], labels),
+        ))
+    return samples
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus.
+    Доступны по токену METRICS_TOKEN или администраторам.
+    """
+    if not METRICS_ENABLED:
+        raise Http404
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if not (
+        (METRICS_TOKEN and authorization == f'Bearer {METRICS_TOKEN}')
+        or request.user.is_staff
+    ):
+        return HttpResponse('Нет доступа', status=403)
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,201 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram_backend import metrics, profiling, querylog, replicas, tracing
+from foodgram_backend.settings import (
+    METRICS_ENABLED, PROFILING_ENABLED, QUERY_LOG_ENABLED, REPLICA_ALIASES,
+    TRACING_ENABLED, TRACING_HEADER, TRACING_SAMPLE_RATE,
+)
+
+
+def view_label(view_func, method):
+    """
+    Имя view для метрик, например RecipeViewSet.list.
+    Для viewset-ов берем действие из карты методов роутера.
+    """
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f'{cls.__name__}.{action}'
+
+
+class QueryStats:
+    """Обертка выполнения SQL, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class MetricsMiddleware:
+    """
+    Сбор метрик по каждому view: время ответа, число и время SQL
+    запросов, размер ответа и статус. Если METRICS_ENABLED выключен,
+    middleware не подключается вовсе.
+    """
+
+    def __init__(self, get_response):
+        if not METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+        view = getattr(request, '_metrics_view', 'unresolved')
+        metrics.requests_total.inc(
+            (view, request.method, str(response.status_code))
+        )
+        metrics.request_duration.observe((view,), duration)
+        metrics.db_queries.observe((view,), stats.count)
+        metrics.db_duration_total.inc((view,), stats.duration)
+        if not response.streaming:
+            metrics.response_size.observe((view,), len(response.content))
+        elif response.has_header('Content-Length'):
+            metrics.response_size.observe(
+                (view,), int(response['Content-Length'])
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._metrics_view = view_label(view_func, request.method)
+
+
+class TracingMiddleware:
+    """
+    Трассировка части запросов: доля задается TRACING_SAMPLE_RATE,
+    а запрос с заголовком TRACING_HEADER трассируется всегда.
+    Без TRACING_ENABLED middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not TRACING_ENABLED:
+            raise MiddlewareNotUsed
+        tracing.install()
+        self.get_response = get_response
+        self.writer = tracing.TraceWriter()
+
+    def _sampled(self, request):
+        return (
+            TRACING_HEADER in request.META
+            or random.random() < TRACING_SAMPLE_RATE
+        )
+
+    def __call__(self, request):
+        if not self._sampled(request):
+            return self.get_response(request)
+        with ExitStack() as stack:
+            trace = stack.enter_context(tracing.start_trace(
+                f'{request.method} {request.path}',
+                query=request.META.get('QUERY_STRING', ''),
+            ))
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(tracing.sql_span)
+                )
+            response = self.get_response(request)
+            trace.args['status'] = response.status_code
+        self.writer.write(trace)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        trace = tracing.current_trace()
+        if trace is not None:
+            trace.args['view'] = view_label(view_func, request.method)
+
+    def process_template_response(self, request, response):
+        if tracing.current_trace() is not None:
+            render = response.render
+
+            def traced_render():
+                with tracing.span('render', 'render'):
+                    return render()
+            response.render = traced_render
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование запроса администратора по заголовку X-Foodgram-Profile
+    или параметру ?_profile (значение memory включает tracemalloc).
+    Остальные запросы проходят без изменений.
+    """
+
+    def __init__(self, get_response):
+        if not PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.profiling_mode(request)
+        if mode is None:
+            return self.get_response(request)
+        return profiling.run_profiled(request, self.get_response, mode)
+
+
+class QueryLogMiddleware:
+    """
+    Журнал медленных запросов и N+1 с привязкой к строке кода.
+    При QUERY_LOG_RAISE повторы приводят к ошибке NPlusOneError,
+    чтобы такие регрессии роняли тесты.
+    """
+
+    def __init__(self, get_response):
+        if not QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        label = f'{request.method} {request.path}'
+        with querylog.query_log(label) as log:
+            response = self.get_response(request)
+        log.report()
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Безопасные запросы к API читают с реплик БД (см. replicas.py).
+    Запросы клиента, недавно писавшего в БД, и все изменяющие запросы
+    обслуживаются основной БД. Без реплик middleware не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not REPLICA_ALIASES:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (request.method not in SAFE_METHODS
+                or not request.path.startswith('/api/')
+                or replicas.is_pinned(request)):
+            response = self.get_response(request)
+            if request.method not in SAFE_METHODS:
+                replicas.pin(response)
+            return response
+        with replicas.reading_from_replicas() as state:
+            response = self.get_response(request)
+        if state['wrote']:
+            replicas.pin(response)
+        return response
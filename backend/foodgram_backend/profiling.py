@@ -0,0 +1,157 @@
+"""Профилирование отдельных запросов администраторами."""
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from django.contrib import admin
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from foodgram_backend.settings import (
+    PROFILING_DIR, PROFILING_HEADER, PROFILING_KEEP, PROFILING_QUERY_PARAM,
+)
+from users.authentication import CachedJWTAuthentication
+
+_lock = threading.Lock()
+# tracemalloc один на процесс: второй профиль памяти остановил бы
+# первый, поэтому одновременно идет только один, остальные - по CPU.
+_memory_lock = threading.Lock()
+
+
+def _is_staff(request):
+    """Администратор по сессии или по JWT токену."""
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+def profiling_mode(request):
+    """
+    Режим профилирования, запрошенный заголовком или параметром:
+    None - не профилировать, 'cpu' или 'memory' (cProfile + tracemalloc).
+    """
+    flag = request.META.get(PROFILING_HEADER)
+    if not flag and PROFILING_QUERY_PARAM in request.META.get(
+        'QUERY_STRING', ''
+    ):
+        flag = request.GET.get(PROFILING_QUERY_PARAM)
+    if not flag or not _is_staff(request):
+        return None
+    return 'memory' if flag == 'memory' else 'cpu'
+
+
+def _report_name(request):
+    slug = re.sub(r'[^\w]+', '-', request.path).strip('-') or 'root'
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    return f'{stamp}-{os.getpid()}-{request.method.lower()}-{slug}'[:150]
+
+
+def _rotate(directory):
+    """Оставляем только PROFILING_KEEP последних профилей."""
+    reports = sorted(
+        directory.glob('*.prof'), key=lambda path: path.stat().st_mtime
+    )
+    for report in reports[:-PROFILING_KEEP]:
+        report.unlink(missing_ok=True)
+        report.with_suffix('.txt').unlink(missing_ok=True)
+
+
+def run_profiled(request, get_response, mode):
+    """Выполняем запрос под cProfile и сохраняем отчет."""
+    memory_busy = (
+        mode == 'memory' and not _memory_lock.acquire(blocking=False)
+    )
+    if memory_busy:
+        mode = 'cpu'
+    if mode == 'memory':
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    try:
+        response = profiler.runcall(get_response, request)
+    finally:
+        snapshot = None
+        if mode == 'memory':
+            try:
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+            finally:
+                _memory_lock.release()
+    name = _report_name(request)
+    directory = Path(PROFILING_DIR)
+    summary = io.StringIO()
+    summary.write(
+        f'{request.method} {request.get_full_path()} '
+        f'-> {response.status_code}\n\n'
+    )
+    if memory_busy:
+        summary.write(
+            'Профиль памяти уже снимается другим запросом, '
+            'снят только профиль CPU.\n\n'
+        )
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats('cumulative').print_stats(50)
+    if snapshot is not None:
+        summary.write('\nTop allocations:\n')
+        for stat in snapshot.statistics('lineno')[:30]:
+            summary.write(f'{stat}\n')
+    with _lock:
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump_stats(directory / f'{name}.prof')
+        (directory / f'{name}.txt').write_text(
+            summary.getvalue(), encoding='utf-8'
+        )
+        _rotate(directory)
+    response['X-Foodgram-Profile-Id'] = name
+    return response
+
+
+def _reports():
+    directory = Path(PROFILING_DIR)
+    if not directory.exists():
+        return []
+    return sorted(
+        directory.glob('*.prof'),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+
+
+def profiles_view(request, name=None):
+    """Страница админки со списком профилей и их содержимым."""
+    reports = {path.stem: path for path in _reports()}
+    if name is None:
+        return TemplateResponse(request, 'admin/profiles.html', {
+            **admin.site.each_context(request),
+            'title': 'Профили запросов',
+            'reports': [
+                {'name': stem, 'size': path.stat().st_size}
+                for stem, path in reports.items()
+            ],
+        })
+    if name not in reports:
+        raise Http404
+    if request.GET.get('download'):
+        return FileResponse(
+            open(reports[name], 'rb'),
+            as_attachment=True,
+            filename=f'{name}.prof',
+        )
+    summary = reports[name].with_suffix('.txt')
+    return TemplateResponse(request, 'admin/profiles.html', {
+        **admin.site.each_context(request),
+        'title': name,
+        'report': name,
+        'summary': (summary.read_text(encoding='utf-8')
+                    if summary.exists() else ''),
+    })
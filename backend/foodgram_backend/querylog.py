@@ -0,0 +1,129 @@
+"""Журнал медленных и повторяющихся (N+1) SQL запросов."""
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from foodgram_backend.settings import (
+    BASE_DIR, QUERY_LOG_RAISE, QUERY_LOG_REPEAT_THRESHOLD,
+    QUERY_LOG_SLOW_THRESHOLD,
+)
+
+logger = logging.getLogger('foodgram.queries')
+
+# Каталоги проекта, строки которых считаем источником запроса
+SOURCE_DIRS = tuple(
+    str(BASE_DIR / directory) for directory in ('api', 'app', 'users')
+)
+DJANGO_DB_DIR = os.path.join('django', 'db', '')
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:[^()]*)\)', re.IGNORECASE)
+_SPACES_RE = re.compile(r'\s+')
+
+
+class NPlusOneError(AssertionError):
+    """Запрос повторился больше допустимого в рамках одного HTTP запроса."""
+
+
+def normalize_sql(sql):
+    """Форма запроса: без литералов и с одинаковыми списками IN."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = _IN_LIST_RE.sub('IN (...)', sql)
+    return _SPACES_RE.sub(' ', sql).strip()
+
+
+def _format_frame(frame):
+    code = frame.f_code
+    return f'{code.co_filename}:{frame.f_lineno} in {code.co_name}'
+
+
+def source_frame():
+    """
+    Ближайшая строка кода проекта, из которой пришел запрос.
+    Если запрос сделан библиотекой (например, ленивая загрузка связи
+    при сериализации), возвращаем ближайший кадр вне django.db.
+    """
+    frame = sys._getframe(1)
+    fallback = None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(SOURCE_DIRS)
+                and not filename.endswith('middleware.py')):
+            return _format_frame(frame)
+        if fallback is None and not (
+            filename == __file__ or DJANGO_DB_DIR in filename
+        ):
+            fallback = frame
+        frame = frame.f_back
+    return _format_frame(fallback) if fallback is not None else 'unknown'
+
+
+class QueryLog:
+    """
+    Обертка выполнения SQL: пишет в журнал запросы дольше
+    QUERY_LOG_SLOW_THRESHOLD и считает повторы одинаковых форм запросов.
+    """
+
+    def __init__(self, label='',
+                 slow_threshold=QUERY_LOG_SLOW_THRESHOLD,
+                 repeat_threshold=QUERY_LOG_REPEAT_THRESHOLD):
+        self.label = label
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.shapes = Counter()
+        self.sources = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            shape = normalize_sql(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == self.repeat_threshold:
+                self.sources[shape] = source_frame()
+            if duration >= self.slow_threshold:
+                logger.warning(
+                    'Медленный запрос %.1f мс %s [%s]: %s',
+                    duration * 1000, self.label, source_frame(), shape,
+                )
+
+    def repeated(self):
+        """Формы запросов, повторенные не меньше порога."""
+        return [
+            (shape, count, self.sources.get(shape, 'unknown'))
+            for shape, count in self.shapes.items()
+            if count >= self.repeat_threshold
+        ]
+
+    def report(self, raise_error=QUERY_LOG_RAISE):
+        repeated = self.repeated()
+        for shape, count, source in repeated:
+            logger.warning(
+                'N+1: запрос повторен %d раз %s [%s]: %s',
+                count, self.label, source, shape,
+            )
+        if repeated and raise_error:
+            raise NPlusOneError('\n'.join(
+                f'{count}x [{source}] {shape}'
+                for shape, count, source in repeated
+            ))
+
+
+@contextmanager
+def query_log(label='', **kwargs):
+    """Журнал запросов для блока кода на всех подключениях к БД."""
+    log = QueryLog(label, **kwargs)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(log))
+        yield log
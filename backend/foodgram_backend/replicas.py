@@ -0,0 +1,162 @@
+"""
+Чтение с реплик БД.
+Безопасные запросы API (GET, HEAD, OPTIONS) читают с реплик по кругу,
+запись и все остальные запросы идут в основную БД (default).
+После записи клиент на REPLICA_PIN_SECONDS закрепляется за основной БД
+подписанной cookie, чтобы сразу видеть свои изменения.
+"""
+import itertools
+import logging
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from foodgram_backend.settings import (
+    REPLICA_ALIASES, REPLICA_PIN_SECONDS, REPLICA_RETRY_INTERVAL,
+)
+
+logger = logging.getLogger('foodgram.replicas')
+
+PIN_COOKIE = 'replica_pin'
+PIN_SALT = 'foodgram.replicas.pin'
+
+_local = threading.local()
+
+
+class ReplicaPool:
+    """
+    Выбор реплики по кругу.
+    Реплика, к которой не удалось подключиться, пропускается
+    REPLICA_RETRY_INTERVAL секунд; если доступных реплик нет,
+    читаем из основной БД.
+    """
+
+    def __init__(self, aliases=REPLICA_ALIASES,
+                 retry_interval=REPLICA_RETRY_INTERVAL):
+        self.aliases = tuple(aliases)
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._cycle = itertools.cycle(self.aliases)
+        self._down_until = {}
+        self.stats = {'reads': 0, 'fallbacks': 0, 'failovers': 0}
+
+    def _connect(self, alias):
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError as error:
+            logger.warning('Реплика %s недоступна: %s', alias, error)
+            return False
+        return True
+
+    def down(self):
+        """Реплики, временно исключенные из выбора."""
+        now = time.monotonic()
+        return [alias for alias, until in self._down_until.items()
+                if until > now]
+
+    def choose(self):
+        """Следующая доступная реплика или основная БД."""
+        for _ in self.aliases:
+            with self._lock:
+                alias = next(self._cycle)
+            if self._down_until.get(alias, 0) > time.monotonic():
+                continue
+            if self._connect(alias):
+                self._down_until.pop(alias, None)
+                self.stats['reads'] += 1
+                return alias
+            self._down_until[alias] = time.monotonic() + self.retry_interval
+            self.stats['failovers'] += 1
+        self.stats['fallbacks'] += 1
+        return DEFAULT_DB_ALIAS
+
+
+replica_pool = ReplicaPool()
+
+
+@contextmanager
+def reading_from_replicas():
+    """
+    Включаем чтение с реплик для текущего запроса.
+    Реплика выбирается при первом чтении и не меняется до конца запроса.
+    Возвращает состояние, в котором отмечается запись в основную БД.
+    """
+    state = _local.state = {'alias': None, 'wrote': False}
+    try:
+        yield state
+    finally:
+        _local.state = None
+
+
+@contextmanager
+def use_primary():
+    """Читаем из основной БД, даже если запрос обслуживается репликами."""
+    _local.primary = getattr(_local, 'primary', 0) + 1
+    try:
+        yield
+    finally:
+        _local.primary -= 1
+
+
+def read_alias():
+    """БД для чтения в текущем потоке."""
+    state = getattr(_local, 'state', None)
+    if (state is None or state['wrote'] or getattr(_local, 'primary', 0)
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+        return DEFAULT_DB_ALIAS
+    if state['alias'] is None:
+        state['alias'] = replica_pool.choose()
+    return state['alias']
+
+
+def mark_write():
+    """После записи запрос дочитывает данные из основной БД."""
+    state = getattr(_local, 'state', None)
+    if state is not None:
+        state['wrote'] = True
+
+
+def is_pinned(request):
+    """Клиент недавно писал в БД: подписанная cookie еще не истекла."""
+    return request.get_signed_cookie(
+        PIN_COOKIE, default=None, salt=PIN_SALT,
+        max_age=REPLICA_PIN_SECONDS,
+    ) is not None
+
+
+def pin(response):
+    """
+    Закрепляем клиента за основной БД после записи.
+    Метка хранится у клиента, а не в кэше: кэш по умолчанию у каждого
+    процесса свой, а следующий запрос может попасть в другой процесс.
+    """
+    response.set_signed_cookie(
+        PIN_COOKIE, '1', salt=PIN_SALT,
+        max_age=math.ceil(REPLICA_PIN_SECONDS),
+        httponly=True, samesite='Lax',
+    )
+
+
+class ReplicaRouter:
+    """
+    Роутер БД: запись всегда в default, чтение - с реплик,
+    если их включил ReplicaMiddleware для текущего запроса.
+    Реплики содержат те же данные, поэтому связи между объектами
+    из разных БД разрешены, а миграции применяются только к default.
+    """
+
+    def db_for_read(self, model, **hints):
+        return read_alias()
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
+from importlib.util import find_spec
 import os
 
 # from dotenv import load_dotenv
@@ -55,13 +56,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram_backend.middleware.MetricsMiddleware',
+    'foodgram_backend.middleware.TracingMiddleware',
+    'foodgram_backend.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'app.middleware.InvalidationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'foodgram_backend.middleware.ReplicaMiddleware',
+    'foodgram_backend.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram_backend.urls'
@@ -69,7 +76,7 @@ ROOT_URLCONF = 'foodgram_backend.urls'
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
+        'DIRS': [BASE_DIR / 'foodgram_backend/templates'],
         'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
@@ -99,6 +106,64 @@ DATABASES = {
     }
 }
 
+### Настройки пула подключений к БД ###
+# Пул подключений в процессе вместо нового подключения на каждый запрос
+DB_POOL_ENABLED = os.getenv('DB_POOL_ENABLED', '').lower() == 'true'
+if DB_POOL_ENABLED:
+    DATABASES['default']['ENGINE'] = 'foodgram_backend.db_pool'
+DATABASES['default']['POOL'] = {
+    # Максимум подключений процесса (для gthread - не меньше числа потоков)
+    'SIZE': int(os.getenv('DB_POOL_SIZE', 10)),
+    # Подключение старше этого числа секунд закрывается
+    'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+    # Сколько секунд ждать свободного подключения
+    'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    # Проверять подключение запросом SELECT 1 при выдаче из пула
+    'CHECK': os.getenv('DB_POOL_CHECK', 'true').lower() == 'true',
+}
+#######################################
+
+### Настройки реплик БД ###
+# Реплики для чтения через запятую: host или host:port.
+# Для проверки на одной машине можно указать основную БД дважды:
+# DB_REPLICA_HOSTS=localhost,localhost
+DB_REPLICA_HOSTS = [
+    host.strip() for host in os.getenv('DB_REPLICA_HOSTS', '').split(',')
+    if host.strip()
+]
+# Сколько секунд после записи клиент читает из основной БД
+REPLICA_PIN_SECONDS = float(os.getenv('REPLICA_PIN_SECONDS', 5))
+# Сколько секунд не обращаться к недоступной реплике
+REPLICA_RETRY_INTERVAL = float(os.getenv('REPLICA_RETRY_INTERVAL', 30))
+REPLICA_CONNECT_TIMEOUT = int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2))
+
+for number, replica in enumerate(DB_REPLICA_HOSTS, start=1):
+    host, _, port = replica.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': {'connect_timeout': REPLICA_CONNECT_TIMEOUT},
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICA_ALIASES = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['foodgram_backend.replicas.ReplicaRouter']
+###########################
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # По умолчанию только 300 записей: мало для фрагментов рецептов.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -152,12 +217,29 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
         'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # JSON через orjson (без него - стандартный json), см. api/renderers.py.
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
+if find_spec('msgpack') is not None:
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append(
+        'api.renderers.MessagePackRenderer'
+    )
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append(
+        'api.renderers.MessagePackParser'
+    )
 
 SIMPLE_JWT = {
    'ACCESS_TOKEN_LIFETIME': timedelta(days=100),
@@ -177,6 +259,13 @@ MIN_AMOUNT = 1
 MIN_COOKING_TIME = 1
 ####################################
 
+### Настройки фильтров рецептов ###
+# Сколько ингредиентов можно передать в ?ingredients= и ?exclude_ingredients=
+RECIPE_FILTER_MAX_INGREDIENTS = int(
+    os.getenv('RECIPE_FILTER_MAX_INGREDIENTS', 10)
+)
+###################################
+
 ### Настройки файлов PDF ###
 class PDFSettings:
     FONT_NAME = 'Liberation Serif'
@@ -190,3 +279,137 @@ class PDFSettings:
 
 SHOPPING_CART_FILENAME = 'Покупки.pdf'
 ############################
+
+### Настройки сброса кэшей процессов ###
+# Как часто (в секундах) процесс сверяет версии своих кэшей с БД.
+# Это же максимальная задержка сброса кэша в других процессах.
+INVALIDATION_POLL_INTERVAL = float(
+    os.getenv('INVALIDATION_POLL_INTERVAL', 1)
+)
+# Журналы (отозванные токены, изменения рецептов) читаются по id.
+# Строки, созданные за столько секунд до прошлого чтения, перечитываются:
+# транзакция с меньшим id могла зафиксироваться позже.
+LOG_READ_OVERLAP = float(os.getenv('LOG_READ_OVERLAP', 60))
+########################################
+
+### Настройки кэша пользователей для аутентификации ###
+AUTH_USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', 1024))
+# Время жизни записи в секундах
+AUTH_USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', 30))
+#######################################################
+
+### Настройки отзыва токенов ###
+# Как часто (в секундах) перечитывать список отозванных токенов целиком
+REVOCATION_RELOAD_INTERVAL = float(
+    os.getenv('REVOCATION_RELOAD_INTERVAL', 3600)
+)
+################################
+
+### Настройки метрик ###
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '').lower() == 'true'
+# Токен для сборщика метрик (заголовок Authorization: Bearer <токен>)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+########################
+
+### Настройки трассировки ###
+TRACING_ENABLED = os.getenv('TRACING_ENABLED', '').lower() == 'true'
+# Доля трассируемых запросов от 0 до 1
+TRACING_SAMPLE_RATE = float(os.getenv('TRACING_SAMPLE_RATE', 0.01))
+# Запрос с этим заголовком (X-Foodgram-Trace) трассируется всегда
+TRACING_HEADER = 'HTTP_X_FOODGRAM_TRACE'
+TRACING_DIR = os.getenv('TRACING_DIR', BASE_DIR / 'traces')
+TRACING_MAX_BYTES = int(os.getenv('TRACING_MAX_BYTES', 50 * 1024 * 1024))
+TRACING_BACKUP_COUNT = int(os.getenv('TRACING_BACKUP_COUNT', 5))
+#############################
+
+### Настройки профилирования запросов ###
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', '').lower() == 'true'
+PROFILING_HEADER = 'HTTP_X_FOODGRAM_PROFILE'
+PROFILING_QUERY_PARAM = '_profile'
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+# Сколько последних профилей хранить
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 50))
+#########################################
+
+### Настройки журнала SQL запросов ###
+QUERY_LOG_ENABLED = os.getenv('QUERY_LOG_ENABLED', '').lower() == 'true'
+# Порог медленного запроса в секундах
+QUERY_LOG_SLOW_THRESHOLD = float(os.getenv('QUERY_LOG_SLOW_THRESHOLD', 0.1))
+# С какого повтора одинаковой формы запроса считать его N+1
+QUERY_LOG_REPEAT_THRESHOLD = int(os.getenv('QUERY_LOG_REPEAT_THRESHOLD', 5))
+# Падать с NPlusOneError при найденных N+1 (для тестов)
+QUERY_LOG_RAISE = os.getenv('QUERY_LOG_RAISE', '').lower() == 'true'
+######################################
+
+### Настройки ленты подписок ###
+# Сколько последних рецептов хранить в ленте пользователя
+FEED_MAX_ENTRIES = int(os.getenv('FEED_MAX_ENTRIES', 1000))
+# Сколько последних рецептов автора добавить в ленту при подписке
+FEED_BACKFILL = int(os.getenv('FEED_BACKFILL', 100))
+# С какого числа подписчиков рецепты автора не рассылаются по лентам,
+# а подмешиваются при чтении
+FEED_CELEBRITY_FOLLOWERS = int(os.getenv('FEED_CELEBRITY_FOLLOWERS', 10000))
+FEED_BATCH_SIZE = int(os.getenv('FEED_BATCH_SIZE', 1000))
+# Пауза обработчика ленты, когда новых рецептов нет (в секундах)
+FEED_WORKER_INTERVAL = float(os.getenv('FEED_WORKER_INTERVAL', 1))
+# Как часто обрезать ленты до FEED_MAX_ENTRIES (в секундах)
+FEED_TRIM_INTERVAL = float(os.getenv('FEED_TRIM_INTERVAL', 3600))
+################################
+
+### Настройки кэша фрагментов рецептов ###
+# Сколько хранить общую для всех часть рецепта (в секундах)
+FRAGMENT_CACHE_TTL = int(os.getenv('FRAGMENT_CACHE_TTL', 24 * 60 * 60))
+###########################################
+
+### Настройки популярных рецептов (?ordering=popular) ###
+# Сколько самых популярных рецептов держать в кэше
+POPULAR_CACHE_SIZE = int(os.getenv('POPULAR_CACHE_SIZE', 1000))
+POPULAR_CACHE_TTL = int(os.getenv('POPULAR_CACHE_TTL', 60))
+#########################################################
+
+### Настройки поиска рецептов по продуктам (/api/recipes/pantry/) ###
+# Индекс в памяти догружает изменения по журналу RecipeChange,
+# а раз в PANTRY_RELOAD_INTERVAL секунд перечитывается целиком.
+PANTRY_RELOAD_INTERVAL = float(os.getenv('PANTRY_RELOAD_INTERVAL', 3600))
+PANTRY_MAX_INGREDIENTS = int(os.getenv('PANTRY_MAX_INGREDIENTS', 50))
+PANTRY_MAX_RESULTS = int(os.getenv('PANTRY_MAX_RESULTS', 100))
+# Сколько секунд хранятся записи журнала изменений рецептов.
+RECIPE_CHANGE_TTL = int(os.getenv('RECIPE_CHANGE_TTL', 2 * 60 * 60))
+#######################################################################
+
+### Настройки похожих рецептов (/api/recipes/{id}/similar/) ###
+# Сколько похожих рецептов хранить для каждого рецепта.
+SIMILAR_RECIPES_COUNT = int(os.getenv('SIMILAR_RECIPES_COUNT', 10))
+# Доля тегов в близости, остальное - ингредиенты.
+SIMILAR_RECIPES_TAG_WEIGHT = float(
+    os.getenv('SIMILAR_RECIPES_TAG_WEIGHT', 0.2)
+)
+# Ингредиенты, которые есть в большем числе рецептов (соль, вода),
+# не дают кандидатов в похожие, но учитываются в пересечении.
+SIMILAR_RECIPES_MAX_POSTING = int(
+    os.getenv('SIMILAR_RECIPES_MAX_POSTING', 10000)
+)
+# Пауза между проверками журнала изменений в команде similar_recipes.
+SIMILAR_RECIPES_INTERVAL = float(os.getenv('SIMILAR_RECIPES_INTERVAL', 300))
+# Как часто (в секундах) команда пересчитывает все рецепты: обновление
+# по журналу не замечает рецепты, ставшие похожими только в одну сторону.
+SIMILAR_RECIPES_REBUILD_INTERVAL = float(
+    os.getenv('SIMILAR_RECIPES_REBUILD_INTERVAL', 24 * 60 * 60)
+)
+#######################################################################
+
+### Настройки админки ###
+# До скольких строк в списке считать их точно, больше - оценка из EXPLAIN
+ADMIN_EXACT_COUNT_LIMIT = int(os.getenv('ADMIN_EXACT_COUNT_LIMIT', 10000))
+# Сколько строк читать из БД за раз при выгрузке
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 2000))
+# XLSX собирается целиком до отправки, большие выгрузки - только CSV/JSON.
+# Лист XLSX вмещает не больше 1048575 строк.
+XLSX_EXPORT_MAX_ROWS = min(
+    int(os.getenv('XLSX_EXPORT_MAX_ROWS', 100000)), 1048575
+)
+# Сколько строк записывать за раз при загрузке
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+# Сколько отличий показывать в отчете о загрузке
+IMPORT_DIFF_LIMIT = int(os.getenv('IMPORT_DIFF_LIMIT', 200))
+#########################
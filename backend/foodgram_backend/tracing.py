@@ -0,0 +1,182 @@
+"""
+Трассировка запросов.
+Спаны пишутся в формате Chrome Trace Event (по событию на строку)
+и открываются в chrome://tracing или ui.perfetto.dev как есть.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from rest_framework import generics, serializers
+
+from foodgram_backend.settings import (
+    TRACING_BACKUP_COUNT, TRACING_DIR, TRACING_MAX_BYTES,
+)
+
+_local = threading.local()
+
+
+class Trace:
+    """Спаны одного запроса."""
+
+    def __init__(self, name, **args):
+        self.name = name
+        self.args = args
+        self.events = []
+        self.start = time.perf_counter()
+
+    def add(self, name, category, start, duration, args):
+        self.events.append({
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round(start * 1e6, 3),
+            'dur': round(duration * 1e6, 3),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+@contextmanager
+def span(name, category='app', **args):
+    """Спан внутри текущей трассы; без активной трассы ничего не делает."""
+    trace = current_trace()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, category, start, time.perf_counter() - start, args)
+
+
+def traced(name_getter, category='app'):
+    """Декоратор, оборачивающий метод в спан."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if current_trace() is None:
+                return func(self, *args, **kwargs)
+            with span(name_getter(self), category):
+                return func(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def sql_span(execute, sql, params, many, context):
+    """Обертка выполнения SQL для connection.execute_wrapper."""
+    with span('sql', 'sql', sql=sql, many=many):
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def start_trace(name, **args):
+    _local.trace = trace = Trace(name, **args)
+    try:
+        yield trace
+    finally:
+        _local.trace = None
+        trace.add(
+            name, 'request', trace.start,
+            time.perf_counter() - trace.start, trace.args,
+        )
+
+
+class TraceWriter:
+    """
+    Запись трасс в файл процесса с ротацией по размеру.
+    Файл начинается с '[' и содержит по событию на строку -
+    такой формат (без закрывающей скобки) допускается спецификацией.
+    """
+
+    def __init__(self, directory=TRACING_DIR, max_bytes=TRACING_MAX_BYTES,
+                 backup_count=TRACING_BACKUP_COUNT):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+
+    @property
+    def path(self):
+        return self.directory / f'trace-{os.getpid()}.json'
+
+    def _rotate(self, path):
+        for index in range(self.backup_count - 1, 0, -1):
+            source = path.with_suffix(f'.json.{index}')
+            if source.exists():
+                source.replace(path.with_suffix(f'.json.{index + 1}'))
+        path.replace(path.with_suffix('.json.1'))
+
+    def write(self, trace):
+        lines = ''.join(
+            json.dumps(event, ensure_ascii=False, default=str) + ',\n'
+            for event in trace.events
+        )
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.path
+            if path.exists() and path.stat().st_size >= self.max_bytes:
+                self._rotate(path)
+            is_new = not path.exists()
+            with open(path, 'a', encoding='utf-8') as trace_file:
+                if is_new:
+                    trace_file.write('[\n')
+                trace_file.write(lines)
+
+
+_installed = False
+
+# Методы RecipeListSerializer, которые оборачиваются в спаны: его
+# to_representation вызывает их напрямую, минуя поля сериализатора.
+RECIPE_SERIALIZER_METHODS = (
+    'load_fragments', 'build_fragments', 'get_tags', 'get_author',
+    'ingredient_representations', 'get_is_favorited',
+    'get_is_in_shopping_cart',
+)
+
+
+def install():
+    """
+    Оборачиваем в спаны фильтрацию, пагинацию, сериализаторы
+    и SerializerMethodField DRF, а также сборку фрагментов и полей
+    RecipeListSerializer. Вызывается один раз и только если
+    трассировка включена, иначе код DRF остается нетронутым.
+    """
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    from api.serializer import RecipeListSerializer
+    generics.GenericAPIView.filter_queryset = traced(
+        lambda view: f'{type(view).__name__}.filter_queryset', 'view'
+    )(generics.GenericAPIView.filter_queryset)
+    generics.GenericAPIView.paginate_queryset = traced(
+        lambda view: f'{type(view).__name__}.paginate_queryset', 'view'
+    )(generics.GenericAPIView.paginate_queryset)
+    serializers.SerializerMethodField.to_representation = traced(
+        lambda field: f'{type(field.parent).__name__}.{field.method_name}',
+        'serializer',
+    )(serializers.SerializerMethodField.to_representation)
+    serializers.Serializer.to_representation = traced(
+        lambda serializer: type(serializer).__name__, 'serializer',
+    )(serializers.Serializer.to_representation)
+    serializers.ListSerializer.to_representation = traced(
+        lambda serializer: f'{type(serializer.child).__name__}(many=True)',
+        'serializer',
+    )(serializers.ListSerializer.to_representation)
+    for method_name in RECIPE_SERIALIZER_METHODS:
+        setattr(RecipeListSerializer, method_name, traced(
+            lambda serializer, method_name=method_name:
+                f'{type(serializer).__name__}.{method_name}',
+            'serializer',
+        )(getattr(RecipeListSerializer, method_name)))
@@ -16,7 +16,21 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from foodgram_backend.metrics import metrics_view
+from foodgram_backend.profiling import profiles_view
+
 urlpatterns = [
     path('api/', include('api.urls')),
+    path(
+        'admin/profiles/',
+        admin.site.admin_view(profiles_view),
+        name='admin-profiles',
+    ),
+    path(
+        'admin/profiles/<str:name>/',
+        admin.site.admin_view(profiles_view),
+        name='admin-profile',
+    ),
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
 ]
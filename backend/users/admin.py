@@ -1,9 +1,10 @@
 from django.contrib import admin
 
+from foodgram_backend.admin_utils import ScaledModelAdmin
 from users.models import User, Follow
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(ScaledModelAdmin):
     """Админка для пользователя."""
     list_display = (
         'username',
@@ -11,19 +12,21 @@ class UserAdmin(admin.ModelAdmin):
         'first_name',
         'last_name',
     )
-    list_filter = ('username',)
-    search_fields = ('username',)
+    list_filter = ('is_staff', 'is_active')
+    search_id_fields = ('pk',)
+    search_prefix_fields = ('username',)
+    search_exact_fields = ('email',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScaledModelAdmin):
     """Админка для подписок на авторов."""
     list_display = (
         'user',
         'author',
     )
-    search_fields = (
-        'user__username', 'user__email', 'author__username', 'author__email'
-    )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_user_fields = ('user', 'author')
 
 
 admin.site.register(User, UserAdmin)
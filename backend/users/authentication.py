@@ -0,0 +1,44 @@
+import copy
+
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from foodgram_backend.replicas import use_primary
+from users.cache import user_cache
+from users.revocation import revocation_list
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация, которая берет пользователя из кэша процесса.
+    К БД обращаемся только при промахе кэша.
+    """
+
+    def get_validated_token(self, raw_token):
+        """Отклоняем токены, отозванные при выходе из приложения."""
+        validated_token = super().get_validated_token(raw_token)
+        jti = validated_token.get(api_settings.JTI_CLAIM)
+        if jti is not None and revocation_list.is_revoked(jti):
+            raise InvalidToken(_('Token is blacklisted'))
+        return validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _('Token contained no recognizable user identification')
+            )
+        # simplejwt не пишет в токен iat, но exp однозначно
+        # задается временем выпуска и сроком жизни токена.
+        issued = validated_token.get('iat', validated_token.get('exp'))
+        key = (str(user_id), issued)
+        user = user_cache.get(key)
+        if user is None:
+            with use_primary():
+                user = super().get_user(validated_token)
+            user_cache.set(key, user)
+        # Отдаем копию, чтобы изменения в запросе не попадали в кэш.
+        return copy.copy(user)
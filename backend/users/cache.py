@@ -0,0 +1,69 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+
+from app.invalidation import bus
+from foodgram_backend.settings import AUTH_USER_CACHE_SIZE, AUTH_USER_CACHE_TTL
+
+# Пространств имен шины для сброса: изменение пользователя сбрасывает
+# только пользователей с тем же остатком id, а не весь кэш.
+INVALIDATION_BUCKETS = 64
+
+
+class UserCache:
+    """
+    LRU-кэш пользователей в памяти процесса с ограниченным временем жизни.
+    Ключ - id пользователя и время выпуска токена.
+    """
+    namespace = 'users:user'
+
+    def __init__(self, maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        for bucket in range(INVALIDATION_BUCKETS):
+            bus.subscribe(
+                self._namespace(bucket),
+                functools.partial(self.clear_bucket, bucket),
+            )
+
+    def _namespace(self, bucket):
+        return f'{self.namespace}:{bucket}'
+
+    def get(self, key):
+        """Пользователь по ключу или None, если записи нет или она стара."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return user
+
+    def set(self, key, user):
+        with self._lock:
+            self._entries[key] = (user, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear_bucket(self, bucket):
+        """Сбрасываем локальные записи пользователей корзины bucket."""
+        with self._lock:
+            for key in [
+                key for key in self._entries
+                if int(key[0]) % INVALIDATION_BUCKETS == bucket
+            ]:
+                del self._entries[key]
+
+    def invalidate(self, user_id):
+        """Сбрасываем пользователя user_id во всех процессах."""
+        bus.publish(self._namespace(int(user_id) % INVALIDATION_BUCKETS))
+
+
+user_cache = UserCache()
@@ -32,11 +32,29 @@ class User(AbstractUser):
         blank=False,
         null=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+        editable=False,
+    )
     REQUIRED_FIELDS = ('username', )
     USERNAME_FIELD = 'email'
 
     class Meta:
         ordering = ('id',)
+        indexes = (
+            # Поиск в админке по началу имени (LIKE 'abc%').
+            models.Index(
+                fields=('username',),
+                name='user_username_prefix_idx',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        )
 
     def __str__(self):
         return f'{self.username} {self.email}'
@@ -49,6 +67,7 @@ class Follow(models.Model):
         related_name='follower',
         verbose_name='Подписчик',
         help_text='Подписчик',
+        db_index=False,
     )
     author = models.ForeignKey(
         User,
@@ -56,17 +75,56 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор рецептов',
         help_text='Автор рецептов',
+        db_index=False,
     )
 
     class Meta:
+        # Внешние ключи покрыты составными индексами в обе стороны.
         constraints = (
             models.UniqueConstraint(
                 fields=('user', 'author',),
                 name='user_not_equal_author',
             ),
         )
+        indexes = (
+            # Подписчики автора: рассылка по лентам и счетчики.
+            models.Index(
+                fields=('author', 'user'),
+                name='follow_author_user_idx',
+            ),
+        )
 
     def __str__(self) -> str:
         return (f'Пользователь {self.user.username} '
                 f'следит за {self.author.username}'
                 )
+
+
+class RevokedToken(models.Model):
+    """Отозванные (после выхода) JWT токены."""
+    jti = models.CharField(
+        max_length=255,
+        unique=True,
+        verbose_name='Идентификатор токена',
+        help_text='Идентификатор токена',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='revoked_tokens',
+        verbose_name='Пользователь',
+        help_text='Пользователь',
+    )
+    expires_at = models.DateTimeField(
+        db_index=True,
+        verbose_name='Срок действия токена',
+        help_text='Срок действия токена',
+    )
+    revoked_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Время отзыва',
+        help_text='Время отзыва',
+    )
+
+    def __str__(self) -> str:
+        return f'{self.jti} ({self.user_id})'
@@ -0,0 +1,81 @@
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from app.invalidation import bus
+from app.watermark import Watermark
+from foodgram_backend.settings import REVOCATION_RELOAD_INTERVAL
+from users.models import RevokedToken
+
+
+class RevocationList:
+    """
+    Множество jti отозванных токенов в памяти процесса.
+    Новые записи догружаются по сигналу шины сброса кэшей
+    (только непрочитанные строки, см. app/watermark.py),
+    а раз в REVOCATION_RELOAD_INTERVAL секунд список перечитывается
+    целиком, чтобы выбросить истекшие токены.
+    """
+    namespace = 'users:revoked_token'
+
+    def __init__(self, reload_interval=REVOCATION_RELOAD_INTERVAL):
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._jtis = set()
+        self._watermark = Watermark('revoked_at')
+        self._loaded_at = None
+        self._stale = True
+        bus.subscribe(self.namespace, self.mark_stale)
+
+    def mark_stale(self):
+        self._stale = True
+
+    def _refresh(self):
+        with self._lock:
+            now = time.monotonic()
+            reload = (self._loaded_at is None
+                      or now - self._loaded_at >= self.reload_interval)
+            # Полную загрузку собираем отдельно и подменяем целиком:
+            # is_revoked читает множество без блокировки.
+            watermark = Watermark('revoked_at') if reload else self._watermark
+            self._stale = False
+            # Догружаем только новые id, поэтому читаем из основной БД:
+            # строка, которой еще нет на реплике, была бы пропущена.
+            rows = watermark.read(
+                RevokedToken.objects.using(DEFAULT_DB_ALIAS).filter(
+                    expires_at__gt=timezone.now(),
+                ),
+                'jti',
+            )
+            if reload:
+                self._jtis = {jti for _, jti in rows}
+                self._watermark = watermark
+                self._loaded_at = now
+            else:
+                self._jtis.update(jti for _, jti in rows)
+
+    def is_revoked(self, jti):
+        """Проверка токена по jti без обращения к БД в обычном случае."""
+        loaded_at = self._loaded_at
+        if self._stale or loaded_at is None or (
+            time.monotonic() - loaded_at >= self.reload_interval
+        ):
+            self._refresh()
+        return jti in self._jtis
+
+    def revoke(self, token, user):
+        """Отзываем токен и оповещаем остальные процессы."""
+        expires_at = datetime.fromtimestamp(token['exp'], tz=dt_timezone.utc)
+        RevokedToken.objects.get_or_create(
+            jti=token[api_settings.JTI_CLAIM],
+            defaults={'user': user, 'expires_at': expires_at},
+        )
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        bus.publish(self.namespace)
+
+
+revocation_list = RevocationList()
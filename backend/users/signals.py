@@ -0,0 +1,29 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.cache import user_cache
+from users.models import User
+
+# Поля, от которых зависят аутентификация и request.user.
+AUTH_FIELDS = {
+    'username', 'email', 'password', 'is_active', 'is_staff', 'is_superuser',
+}
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_cache(sender, instance, created, update_fields=None,
+                          raw=False, **kwargs):
+    """Сбрасываем пользователя в кэше при изменении."""
+    if created or raw:
+        # Нового пользователя в кэше еще нет.
+        return
+    if update_fields is not None and not AUTH_FIELDS & set(update_fields):
+        # Например, обновление last_login при входе.
+        return
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    """Удаленный пользователь не должен оставаться в кэше."""
+    user_cache.invalidate(instance.pk)